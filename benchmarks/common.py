@@ -0,0 +1,46 @@
+"""
+Shared setup for the benchmark scripts. Run them from the repository root, e.g.
+
+    python -m benchmarks.hot_stock
+
+They use a throwaway SQLite database and a locmem cache, or the Redis at
+BENCH_REDIS_URL when it is set.
+"""
+import os
+import tempfile
+
+from inventory_app.testing import best_time as timed, count_queries
+
+__all__ = ['authenticated_client', 'count_queries', 'setup_django', 'timed']
+
+
+def setup_django():
+    database = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    os.environ['DATABASE_URL'] = f'sqlite:///{database}'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inventory_management_system_api.settings')
+
+    import django
+    from django.conf import settings
+
+    django.setup()
+    settings.DEBUG = False  # no query log growing across iterations
+    settings.ALLOWED_HOSTS = ['*']
+    settings.TOKEN_BUCKETS = {}  # benchmarks fire far more than a client's burst; throttle.py sets its own
+    redis_url = os.getenv('BENCH_REDIS_URL')
+    if redis_url:
+        settings.CACHES['default']['LOCATION'] = redis_url
+    else:
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def authenticated_client():
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+
+    user, _ = User.objects.get_or_create(username='bench')
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
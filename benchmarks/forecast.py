@@ -0,0 +1,71 @@
+"""
+Demand forecasting for every SKU at once: the whole job against the database
+(the demand is summed per SKU by a GROUP BY), then the NumPy side on synthetic
+demand at catalog scale, next to the same computation as a per-SKU Python loop.
+
+    python -m benchmarks.forecast [--size 2000] [--days 90] [--skus 1000000] [--density 0.1]
+"""
+import argparse
+import tempfile
+import time
+from datetime import timedelta
+
+from .common import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=2000, help="SKUs in the database")
+    parser.add_argument('--days', type=int, default=90, help="days of demand per SKU in the database")
+    parser.add_argument('--skus', type=int, default=1_000_000, help="SKUs in the synthetic run")
+    parser.add_argument('--history', type=int, default=365, help="days of history in the synthetic run")
+    parser.add_argument('--density', type=float, default=0.1, help="share of SKU-days with any demand")
+    parser.add_argument('--loop-skus', type=int, default=2000, help="SKUs timed in the per-SKU loop")
+    args = parser.parse_args()
+    setup_django()
+
+    import numpy as np
+    from django.utils import timezone
+    from inventory_app import forecasting
+    from inventory_app.models import Category, DailyDemand, Inventory, Product
+
+    category = Category.objects.create(name='forecast')
+    products = Product.objects.bulk_create(
+        (Product(name=f'product {index}', category=category, price=1) for index in range(args.size)), batch_size=1000)
+    items = Inventory.objects.bulk_create((Inventory(product=product, quantity=index % 200)
+                                           for index, product in enumerate(products)), batch_size=1000)
+    today = timezone.localdate()
+    DailyDemand.objects.bulk_create(
+        (DailyDemand(inventory=item, day=today - timedelta(days=day), quantity=(item.id + day) % 7)
+         for item in items for day in range(1, args.days + 1)), batch_size=5000)
+    stats = forecasting.run_forecast(tempfile.mkdtemp(), history_days=args.days)
+    print(f"{args.size} SKUs x {args.days} days from the database: {stats['seconds']:.2f}s "
+          f"({stats['reorder']} to reorder)")
+
+    skus, days = args.skus, args.history
+    rows = int(skus * days * args.density)
+    rng = np.random.default_rng(0)
+    sku = rng.integers(0, skus, rows)
+    day = rng.integers(0, days, rows).astype(np.int32)
+    quantity = rng.integers(1, 20, rows).astype(np.float64)
+    on_hand = rng.integers(0, 500, skus)
+
+    started = time.perf_counter()
+    forecasting.forecast(*forecasting.demand_sums(sku, day, quantity, skus, days), on_hand, days)
+    vectorized = time.perf_counter() - started
+    print(f"{skus} SKUs x {days} days ({rows} demand rows): vectorized {vectorized:.2f}s")
+
+    order = np.argsort(sku, kind='stable')
+    bounds = np.searchsorted(sku[order], np.arange(args.loop_skus + 1))
+    started = time.perf_counter()
+    for index in range(args.loop_skus):
+        selected = order[bounds[index]:bounds[index + 1]]
+        sums = forecasting.demand_sums(np.zeros(len(selected), dtype=np.int64), day[selected], quantity[selected],
+                                       1, days)
+        forecasting.forecast(*sums, on_hand[index:index + 1], days)
+    loop = (time.perf_counter() - started) / args.loop_skus * skus
+    print(f"{'':16}per-SKU loop {loop:.0f}s (extrapolated from {args.loop_skus} SKUs)")
+
+
+if __name__ == '__main__':
+    main()
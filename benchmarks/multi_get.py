@@ -0,0 +1,50 @@
+"""
+Fetching a cart's worth of products: N single `GET /products/<id>` requests
+against one `GET /products/?ids=...`, with a cold and a warm cache.
+
+    python -m benchmarks.multi_get [--size 50]
+"""
+import argparse
+
+from .common import authenticated_client, count_queries, setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=50, help="products per page")
+    args = parser.parse_args()
+    setup_django()
+
+    from django.core.cache import cache
+    from django.urls import reverse
+    from inventory_app.models import Category, Product
+
+    category = Category.objects.create(name='bench')
+    products = Product.objects.bulk_create(
+        Product(name=f'product {index}', category=category, description='x' * 200, price=index)
+        for index in range(args.size))
+    ids = [product.id for product in products]
+    client = authenticated_client()
+
+    def single_gets():
+        for product_id in ids:
+            assert client.get(reverse('product-detail', kwargs={'product_id': product_id})).status_code == 200
+
+    def multi_get():
+        response = client.get(reverse('product-list'), {'ids': ','.join(map(str, ids))})
+        assert len(response.data['results']) == len(ids)
+
+    print(f"{args.size} products")
+    for label, func in [("single GETs", single_gets), ("multi-get", multi_get)]:
+        def cold():
+            cache.clear()
+            func()
+        with count_queries() as queries:
+            cold()
+        cold_time = timed(cold)
+        warm_time = timed(func)
+        print(f"{label:12}: cold {cold_time * 1000:8.2f} ms ({len(queries)} queries)   warm {warm_time * 1000:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Deleting a large category: Django's cascading delete against the batched
+purge. Reports the peak Python memory and the longest transaction, which is
+how long other requests may wait on the locks.
+
+    python -m benchmarks.purge [--size 20000] [--batch-size 500]
+"""
+import argparse
+import time
+import tracemalloc
+
+from .common import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=20000, help="products in the category")
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+    setup_django()
+
+    from django.db import transaction
+    from inventory_app import purge
+    from inventory_app.models import Category, Inventory, Product
+
+    def populate(name):
+        category = Category.objects.create(name=name)
+        products = Product.objects.bulk_create(
+            (Product(name=f'{name} {index}', category=category, description='x' * 200, price=index)
+             for index in range(args.size)), batch_size=1000)
+        Inventory.objects.bulk_create((Inventory(product=product, quantity=1) for product in products),
+                                      batch_size=1000)
+        return category
+
+    def cascade(category):
+        started = time.perf_counter()
+        with transaction.atomic():
+            category.delete()
+        seconds = time.perf_counter() - started
+        return seconds, seconds
+
+    def batched(category):
+        stats = purge.purge_category(category.id, batch_size=args.batch_size, pause=0)
+        return stats['seconds'], stats['longest_batch_seconds']
+
+    print(f"{args.size} products with inventory")
+    for label, func in [("cascade", cascade), ("purge", batched)]:
+        category = populate(label)
+        tracemalloc.start()
+        seconds, longest = func(category)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{label:8}: {seconds * 1000:9.1f} ms total, longest transaction {longest * 1000:8.1f} ms, "
+              f"peak memory {peak / 1e6:6.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Per-row cost of ProductSerializer/InventorySerializer(many=True) against the
+RowSerializer fast path, from queryset to response dicts. The ModelSerializer
+side gets select_related so it is not charged for N+1 queries.
+
+    python -m benchmarks.row_serializer [--rows 10000]
+"""
+import argparse
+
+from .common import setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args()
+    setup_django()
+
+    from inventory_app.models import Category, Inventory, Product
+    from inventory_app.serializers import InventorySerializer, ProductSerializer, RowSerializer
+
+    category = Category.objects.create(name='bench')
+    products = Product.objects.bulk_create(
+        (Product(name=f'product {index}', category=category, description='x' * 100, price=index)
+         for index in range(args.rows)), batch_size=1000)
+    Inventory.objects.bulk_create((Inventory(product=product, quantity=10) for product in products), batch_size=1000)
+
+    cases = [
+        ("products", ProductSerializer, Product.objects.select_related('category')),
+        ("inventory", InventorySerializer, Inventory.objects.select_related('product')),
+    ]
+    print(f"{args.rows} rows, microseconds per row")
+    for label, serializer_class, queryset in cases:
+        model_time = timed(lambda: serializer_class(queryset.all(), many=True).data, repeat=3)
+        fast_time = timed(lambda: RowSerializer(serializer_class).serialize(queryset.all()), repeat=3)
+        model_us, fast_us = model_time / args.rows * 1e6, fast_time / args.rows * 1e6
+        print(f"{label:10}: ModelSerializer {model_us:7.2f}   RowSerializer {fast_us:7.2f}   ({model_us / fast_us:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
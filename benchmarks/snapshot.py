@@ -0,0 +1,85 @@
+"""
+Analytics scans against the database and against the columnar snapshot:
+stock by category, price distribution and dead stock. A second, synthetic
+snapshot shows how the reader scales to millions of rows.
+
+    python -m benchmarks.snapshot [--size 20000] [--synthetic 5000000]
+"""
+import argparse
+import tempfile
+import time
+from datetime import timedelta
+
+from .common import setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=20000, help="products in the database")
+    parser.add_argument('--synthetic', type=int, default=5_000_000, help="rows in the synthetic snapshot")
+    args = parser.parse_args()
+    setup_django()
+
+    import numpy as np
+    from django.db.models import Sum
+    from django.utils import timezone
+    from inventory_app import snapshot
+    from inventory_app.models import Category, Inventory, Product
+
+    categories = Category.objects.bulk_create(Category(name=f'category {index}') for index in range(50))
+    products = Product.objects.bulk_create(
+        (Product(name=f'product {index}', category=categories[index % 50], price=index % 1000)
+         for index in range(args.size)), batch_size=1000)
+    Inventory.objects.bulk_create((Inventory(product=product, quantity=index % 100)
+                                   for index, product in enumerate(products)), batch_size=1000)
+
+    root = tempfile.mkdtemp()
+    started = time.perf_counter()
+    snapshot.write_snapshot(root)
+    print(f"{args.size} products: full snapshot {time.perf_counter() - started:.2f}s")
+    Product.objects.filter(id__in=[product.id for product in products[:100]]).update(price=5, updated_at=timezone.now())
+    started = time.perf_counter()
+    snapshot.refresh_snapshot(root)
+    print(f"{'':16}refresh after 100 updates {time.perf_counter() - started:.2f}s")
+    snap = snapshot.Snapshot(root)
+    cutoff = timezone.now() - timedelta(days=90)
+
+    def database_scans():
+        dict(Category.objects.annotate(stock=Sum('products__inventory__quantity')).values_list('name', 'stock'))
+        np.histogram([float(price) for price in Product.objects.values_list('price', flat=True)], bins=10)
+        list(Inventory.objects.filter(quantity__gt=0, updated_at__lt=cutoff).values_list('product_id', flat=True))
+
+    def snapshot_scans(snap):
+        snap.stock_by_category()
+        snap.price_distribution()
+        snap['product_id'][snap.dead_stock()]
+
+    print(f"{'database':16}: {timed(database_scans) * 1000:9.1f} ms")
+    print(f"{'snapshot':16}: {timed(lambda: snapshot_scans(snap)) * 1000:9.1f} ms")
+
+    rows = args.synthetic
+    rng = np.random.default_rng(0)
+    strings = snapshot.StringDictionary()
+    category_names = np.array([strings.code(f'category {index}') for index in range(1000)], dtype=np.int32)
+    now = int(time.time())
+    columns = {
+        'product_id': np.arange(1, rows + 1, dtype=np.int64),
+        'category_id': rng.integers(1, 1001, rows, dtype=np.int64),
+        'name': np.zeros(rows, dtype=np.int32),
+        'price_cents': rng.integers(100, 100_000, rows, dtype=np.int64),
+        'created_at': np.full(rows, now, dtype=np.int64),
+        'updated_at': np.full(rows, now, dtype=np.int64),
+        'inventory_id': np.arange(1, rows + 1, dtype=np.int64),
+        'quantity': rng.integers(0, 500, rows, dtype=np.int64),
+        'stock_updated_at': now - rng.integers(0, 365 * 86400, rows, dtype=np.int64),
+    }
+    synthetic_root = tempfile.mkdtemp()
+    snapshot._publish(synthetic_root, columns,
+                      {'category_id': np.arange(1, 1001, dtype=np.int64), 'name': category_names}, strings,
+                      {'watermark': timezone.now().isoformat(), 'full': True})
+    big = snapshot.Snapshot(synthetic_root)
+    print(f"{rows} synthetic rows: {timed(lambda: snapshot_scans(big)) * 1000:9.1f} ms for the same scans")
+
+
+if __name__ == '__main__':
+    main()
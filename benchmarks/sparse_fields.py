@@ -0,0 +1,37 @@
+"""
+Bytes over the wire and time for one product list page with and without
+`?fields=id,name,price`.
+
+    python -m benchmarks.sparse_fields [--rows 10000] [--description-size 500]
+"""
+import argparse
+
+from .common import authenticated_client, setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--description-size', type=int, default=500)
+    args = parser.parse_args()
+    setup_django()
+
+    from django.urls import reverse
+    from inventory_app.models import Category, Product
+
+    category = Category.objects.create(name='bench')
+    Product.objects.bulk_create(
+        (Product(name=f'product {index}', category=category, description='x' * args.description_size, price=index)
+         for index in range(args.rows)), batch_size=1000)
+    client = authenticated_client()
+
+    print(f"{args.rows} rows, {args.description_size}-byte descriptions")
+    for label, params in [("all fields", {}), ("id,name,price", {'fields': 'id,name,price'})]:
+        response = client.get(reverse('product-list'), params)
+        assert response.status_code == 200
+        seconds = timed(lambda: client.get(reverse('product-list'), params).content, repeat=3)
+        print(f"{label:14}: {len(response.content) / 1024:9.1f} KiB   {seconds * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Per-request overhead of TokenBucketThrottle: the bare allow_request() call and a
+full `GET /products/<id>` (warm cache) with and without the throttle.
+
+    python -m benchmarks.throttle [--requests 2000]
+"""
+import argparse
+
+from .common import authenticated_client, setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+    setup_django()
+
+    from django.conf import settings
+    from django.test.utils import override_settings
+    from django.urls import reverse
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from inventory_app.models import Category, Product
+    from inventory_app.throttling import TokenBucketThrottle
+    from inventory_app.views import ProductAPIView
+
+    product = Product.objects.create(name='bench', category=Category.objects.create(name='bench'), price=1)
+    client = authenticated_client()
+    url = reverse('product-detail', kwargs={'product_id': product.id})
+    unlimited = {ProductAPIView.throttle_scope: {'rate': 1e9, 'capacity': 1e9}}
+
+    with override_settings(TOKEN_BUCKETS=unlimited):
+        request = Request(APIRequestFactory().get(url))
+        request.user = client.handler._force_user
+        throttle, view = TokenBucketThrottle(), ProductAPIView()
+
+        def throttle_only():
+            for _ in range(args.requests):
+                throttle.allow_request(request, view)
+
+        def requests():
+            for _ in range(args.requests):
+                client.get(url)
+
+        client.get(url)  # warm the product cache
+        bare = timed(throttle_only, repeat=3) / args.requests
+        with_throttle = timed(requests, repeat=3) / args.requests
+        ProductAPIView.throttle_classes = []
+        without_throttle = timed(requests, repeat=3) / args.requests
+
+    print(f"cache backend: {settings.CACHES['default']['BACKEND']}")
+    print(f"allow_request()          : {bare * 1e6:8.1f} us")
+    print(f"GET with throttle        : {with_throttle * 1e6:8.1f} us")
+    print(f"GET without throttle     : {without_throttle * 1e6:8.1f} us")
+
+
+if __name__ == '__main__':
+    main()
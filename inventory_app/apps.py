@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class InventoryAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory_app'
+
+    def ready(self):
+        # Registers the job handlers
+        from . import tasks  # noqa: F401
@@ -0,0 +1,108 @@
+"""
+Refills the product_<id>/inventory_<id> entries read by the views, e.g. after a
+deploy or a Redis failover. Used by `manage.py warm_cache` and the
+`rebuild_cache` job.
+"""
+import random
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Inventory, Product
+from .redis_utils import get_redis_client
+from .serializers import InventorySerializer, ProductSerializer, RowSerializer
+from .utils import chunked_ids
+
+CACHE_TIMEOUT = 60*15
+JITTER_BUCKETS = 8
+
+TARGETS = [
+    ('product', Product, ProductSerializer),
+    ('inventory', Inventory, InventorySerializer),
+]
+
+
+def top_ids(model, limit):
+    """
+    The `limit` rows to warm first: hot SKUs, then the most recently updated
+    products. Reads are not tracked, so recent writes stand in for popularity.
+    """
+    if model is Product:
+        return list(model.objects.order_by('-updated_at', '-id').values_list('id', flat=True)[:limit])
+    hot = list(model.objects.filter(id__in=settings.HOT_SKU_IDS).values_list('id', flat=True)[:limit])
+    recent = (model.objects.exclude(id__in=hot).order_by('-product__updated_at', '-id')
+              .values_list('id', flat=True)[:max(limit - len(hot), 0)])
+    return hot + list(recent)
+
+
+def id_chunks(model, limit, chunk_size):
+    if limit is None:
+        yield from chunked_ids(model.objects.all(), chunk_size)
+        return
+    ids = top_ids(model, limit)
+    for start in range(0, len(ids), chunk_size):
+        yield ids[start:start + chunk_size]
+
+
+def jittered(entries, jitter):
+    """ Split entries into a few set_many batches whose TTLs are spread by +/- `jitter` """
+    if not jitter:
+        yield CACHE_TIMEOUT, entries
+        return
+    batches = defaultdict(dict)
+    for key, value in entries.items():
+        batches[random.randrange(JITTER_BUCKETS)][key] = value
+    for index, batch in batches.items():
+        spread = 1 - jitter + 2 * jitter * index / (JITTER_BUCKETS - 1)
+        yield int(CACHE_TIMEOUT * spread), batch
+
+
+def add_many(entries, timeout):
+    """ Write only the keys that are still missing (SET NX), pipelined on Redis; returns how many were written """
+    redis = get_redis_client()
+    if redis is None:
+        return sum(cache.add(key, value, timeout=timeout) for key, value in entries.items())
+    pipeline = redis.pipeline(transaction=False)
+    for key, value in entries.items():
+        cache.client.set(key, value, timeout=timeout, nx=True, client=pipeline)
+    return sum(bool(added) for added in pipeline.execute())
+
+
+def warm_cache(limit=None, chunk_size=1000, jitter=0.1, refresh=False, pause=0, progress=None):
+    """
+    Load up to `limit` rows per model (all when None) in chunked queries and
+    write them in pipelined batches. Unless `refresh`, keys that are already
+    cached are neither loaded nor written: they are skipped up front, and the
+    writes only fill missing keys (SET NX), so a fresher value a request writes
+    between our read and our write is not overwritten. `pause` sleeps between chunks to spare the
+    database while the app is serving. `progress(done)` gets the rows handled so far.
+    """
+    started = time.perf_counter()
+    written = skipped = 0
+    for key_prefix, model, serializer_class in TARGETS:
+        rows = RowSerializer(serializer_class)
+        for ids in id_chunks(model, limit, chunk_size):
+            if not refresh:
+                present = cache.get_many([f'{key_prefix}_{item_id}' for item_id in ids])
+                skipped += len(present)
+                ids = [item_id for item_id in ids if f'{key_prefix}_{item_id}' not in present]
+            if ids:
+                entries = {f'{key_prefix}_{data["id"]}': data for data in rows.serialize(model.objects.filter(id__in=ids))}
+                for timeout, batch in jittered(entries, jitter):
+                    if refresh:
+                        cache.set_many(batch, timeout=timeout)
+                        written += len(batch)
+                    else:
+                        added = add_many(batch, timeout)
+                        written += added
+                        skipped += len(batch) - added
+            if progress:
+                progress(written + skipped)
+            if pause:
+                time.sleep(pause)
+
+    seconds = time.perf_counter() - started
+    return {"keys": written, "skipped": skipped, "seconds": round(seconds, 3),
+            "keys_per_second": round(written / seconds) if seconds else written}
@@ -0,0 +1,91 @@
+"""
+Versioned directories of NumPy column files, shared by the analytics snapshot
+(snapshot.py) and the demand forecast (forecasting.py).
+
+A version holds `<table>.<column>.npy` files and a meta.json. Writers build it
+in a hidden staging directory, rename it into place and then switch the CURRENT
+pointer with an atomic replace, so readers never see a half-written version and
+keep the one they opened.
+"""
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+from django.utils import timezone
+
+KEEP_VERSIONS = 2
+
+
+def load_column(path):
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:  # empty columns cannot be mapped on some NumPy versions
+        return np.load(path)
+
+
+def versions(root):
+    return sorted(path for path in root.iterdir() if path.is_dir() and not path.name.startswith('.'))
+
+
+def save_version(root, tables, meta, write_extra=None):
+    """
+    Write `tables` ({table: {column: array}}) and `meta` as a new version of
+    `root`, point CURRENT at it and prune old versions. `write_extra(path)` can
+    add files of its own before the version is published.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    version = timezone.now().strftime('%Y%m%dT%H%M%S%f')
+    staging = root / f'.{version}'
+    staging.mkdir()
+    for table, columns in tables.items():
+        for name, values in columns.items():
+            np.save(staging / f'{table}.{name}.npy', values)
+    if write_extra:
+        write_extra(staging)
+    (staging / 'meta.json').write_text(json.dumps({**meta, 'version': version}, indent=2))
+    os.replace(staging, root / version)
+
+    pointer = root / '.CURRENT'
+    pointer.write_text(version)
+    os.replace(pointer, root / 'CURRENT')
+    # Readers keep their maps of a pruned version: unlinked files live on until unmapped
+    for old in versions(root)[:-KEEP_VERSIONS]:
+        shutil.rmtree(old, ignore_errors=True)
+    return root / version
+
+
+def has_version(root):
+    return (Path(root) / 'CURRENT').exists()
+
+
+class ColumnStore:
+    """
+    The current version of `root`. Every column is memory-mapped when the store
+    is opened: mapping is cheap, pages are only read when a column is used, and
+    the maps keep the files readable after a later save_version prunes them.
+    """
+    table = None  # default table for store[column]
+
+    def __init__(self, root):
+        root = Path(root)
+        self.path = root / (root / 'CURRENT').read_text().strip()
+        self.meta = json.loads((self.path / 'meta.json').read_text())
+        self._columns = {}
+        for path in self.path.glob('*.npy'):
+            table, name = path.stem.split('.', 1)
+            self._columns[(table, name)] = load_column(path)
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    def column(self, name, table=None):
+        key = (table or self.table, name)
+        if key not in self._columns:
+            self._columns[key] = load_column(self.path / f'{key[0]}.{name}.npy')
+        return self._columns[key]
@@ -0,0 +1,233 @@
+"""
+Demand forecasts and reorder suggestions for every SKU at once.
+
+The database reduces DailyDemand (units taken per SKU and day) to three sums
+per SKU in one GROUP BY inventory_id: demand and squared demand over the last
+FORECAST_WINDOW_DAYS, and demand weighted by (1 - FORECAST_ALPHA) ** age in
+days. Only one row per SKU with demand leaves the database, and everything
+else is NumPy arithmetic over SKU-sized arrays, with no Python loop per SKU or
+per demand row. For each SKU:
+
+- sma: moving average of daily demand over FORECAST_WINDOW_DAYS
+- ewma: exponentially smoothed daily demand (FORECAST_ALPHA) over the history
+- std: standard deviation of daily demand over the window
+- safety_stock = z * std * sqrt(lead time)
+- reorder_point = ewma * lead time + safety_stock
+- suggested_order: when on hand <= reorder point, the units that bring it back
+  to ewma * (lead time + review period) + safety_stock; otherwise 0
+- days_of_cover = on hand / ewma
+
+Results are stored as a version of column files in FORECAST_DIR (see
+columns.py) and read by the forecast endpoints.
+"""
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, DateField, F, FloatField, Func, IntegerField, Q, Sum, Value
+from django.db.models.functions import Power
+from django.utils import timezone
+
+from .columns import ColumnStore, save_version
+from .models import DailyDemand, Inventory
+from .utils import chunked_rows
+
+CHUNK_SIZE = 50000
+
+RESULT_COLUMNS = ('inventory_id', 'on_hand', 'sma', 'ewma', 'std', 'safety_stock', 'reorder_point',
+                  'suggested_order', 'days_of_cover')
+
+
+class DaysSince(Func):
+    """ Whole days from `start` to a date column, as an integer """
+    output_field = IntegerField()
+    template = '(%(expressions)s)'
+    arg_joiner = ' - '
+
+    def __init__(self, expression, start):
+        super().__init__(expression, Value(start, output_field=DateField()))
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='CAST(ROUND(julianday(%(expressions)s)) AS INTEGER)',
+                           arg_joiner=') - julianday(', **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='DATEDIFF', template='%(function)s(%(expressions)s)',
+                           arg_joiner=', ', **extra_context)
+
+
+def _window_alpha(window, alpha, days):
+    window = min(settings.FORECAST_WINDOW_DAYS if window is None else window, days)
+    return window, settings.FORECAST_ALPHA if alpha is None else alpha
+
+
+def load_stock(chunk_size=CHUNK_SIZE):
+    """ Inventory ids (ascending) and their quantities on hand """
+    ids, quantities = [], []
+    for rows in chunked_rows(Inventory.objects.all(), ('id', 'quantity'), chunk_size):
+        chunk_ids, chunk_quantities = zip(*rows)
+        ids.append(np.array(chunk_ids, dtype=np.int64))
+        quantities.append(np.array(chunk_quantities, dtype=np.int64))
+    if not ids:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(ids), np.concatenate(quantities)
+
+
+def load_demand(inventory_ids, start, days, window=None, alpha=None, chunk_size=CHUNK_SIZE):
+    """
+    Per-SKU sums of DailyDemand in [start, start + days), aggregated by the
+    database and aligned with `inventory_ids`: (window total, window sum of
+    squares, decay-weighted total, demand rows). Demand of ids missing from
+    `inventory_ids`, e.g. rows deleted since they were loaded, is left out.
+    """
+    window, alpha = _window_alpha(window, alpha, days)
+    recent = Q(day__gte=start + timedelta(days=days - window))
+    age = Value(days - 1) - DaysSince(F('day'), start)
+    rows = (DailyDemand.objects.filter(day__gte=start, day__lt=start + timedelta(days=days))
+            .values('inventory_id').order_by('inventory_id')
+            .annotate(window_total=Sum('quantity', filter=recent, default=0),
+                      window_squares=Sum(F('quantity') * F('quantity'), filter=recent, default=0),
+                      smoothed=Sum(F('quantity') * Power(Value(1.0 - alpha), age), output_field=FloatField()),
+                      rows=Count('id'))
+            .values_list('inventory_id', 'window_total', 'window_squares', 'smoothed', 'rows'))
+
+    sums = [np.zeros(len(inventory_ids)) for _ in range(3)]
+    demand_rows = 0
+    chunk = []
+    for row in rows.iterator(chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            demand_rows += _add_chunk(sums, inventory_ids, chunk)
+            chunk = []
+    if chunk:
+        demand_rows += _add_chunk(sums, inventory_ids, chunk)
+    return (*sums, demand_rows)
+
+
+def _add_chunk(sums, inventory_ids, chunk):
+    ids, *values, counts = (np.array(column) for column in zip(*chunk))
+    positions = np.searchsorted(inventory_ids, ids)
+    found = positions < len(inventory_ids)
+    found[found] = inventory_ids[positions[found]] == ids[found]
+    for total, column in zip(sums, values):
+        total[positions[found]] = column[found]
+    return int(counts[found].sum())
+
+
+def demand_sums(sku, day, quantity, skus, days, window=None, alpha=None):
+    """
+    The sums load_demand gets from the database, from demand triplets: `sku`
+    indexes the SKUs, `day` counts from 0 (oldest) to `days - 1` (most recent).
+    """
+    window, alpha = _window_alpha(window, alpha, days)
+    recent = day >= days - window
+    window_total = np.bincount(sku[recent], weights=quantity[recent], minlength=skus)
+    window_squares = np.bincount(sku[recent], weights=quantity[recent] ** 2, minlength=skus)
+    decay = (1 - alpha) ** np.arange(days - 1, -1, -1, dtype=np.float64)
+    smoothed = np.bincount(sku, weights=quantity * decay[day], minlength=skus)
+    return window_total, window_squares, smoothed
+
+
+def forecast(window_total, window_squares, smoothed, on_hand, days, window=None, alpha=None, lead_time=None,
+             review=None, z=None):
+    """ Forecast columns for `len(on_hand)` SKUs from their per-SKU demand sums """
+    window, alpha = _window_alpha(window, alpha, days)
+    lead_time = settings.FORECAST_LEAD_TIME_DAYS if lead_time is None else lead_time
+    review = settings.FORECAST_REVIEW_DAYS if review is None else review
+    z = settings.FORECAST_SERVICE_Z if z is None else z
+
+    sma = window_total / window
+    # Days without a row count as zero demand
+    std = np.sqrt(np.maximum(window_squares / window - sma ** 2, 0))
+    # Weights alpha * (1 - alpha) ** age, normalized over the history: they sum to 1 - (1 - alpha) ** days
+    ewma = alpha * smoothed / (1 - (1 - alpha) ** days)
+
+    safety_stock = z * std * np.sqrt(lead_time)
+    reorder_point = ewma * lead_time + safety_stock
+    order_up_to = ewma * (lead_time + review) + safety_stock
+    suggested_order = np.where(on_hand <= reorder_point, np.ceil(np.maximum(order_up_to - on_hand, 0)), 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(ewma > 0, on_hand / ewma, np.inf)
+
+    return {
+        'on_hand': on_hand.astype(np.int64),
+        'sma': sma.astype(np.float32),
+        'ewma': ewma.astype(np.float32),
+        'std': std.astype(np.float32),
+        'safety_stock': safety_stock.astype(np.float32),
+        'reorder_point': reorder_point.astype(np.float32),
+        'suggested_order': suggested_order.astype(np.int64),
+        'days_of_cover': days_of_cover.astype(np.float32),
+    }
+
+
+def run_forecast(root=None, history_days=None, progress=None):
+    """ Forecast every SKU from the demand up to yesterday and publish the result columns """
+    started = time.perf_counter()
+    history_days = history_days or settings.FORECAST_HISTORY_DAYS
+    end = timezone.localdate()  # today is still being sold, so it is left out
+    start = end - timedelta(days=history_days)
+
+    inventory_ids, on_hand = load_stock()
+    if progress:
+        progress(10)
+    *sums, demand_rows = load_demand(inventory_ids, start, history_days)
+    if progress:
+        progress(80)
+    columns = {'inventory_id': inventory_ids, **forecast(*sums, on_hand, history_days)}
+    meta = {
+        'rows': len(inventory_ids),
+        'generated_at': timezone.now().isoformat(),
+        'history_start': start.isoformat(),
+        'history_days': history_days,
+        'demand_rows': demand_rows,
+    }
+    path = save_version(root or settings.FORECAST_DIR, {'forecast': columns}, meta)
+    return {"version": path.name, "skus": len(inventory_ids), "demand_rows": demand_rows,
+            "reorder": int((columns['suggested_order'] > 0).sum()),
+            "seconds": round(time.perf_counter() - started, 3)}
+
+
+class Forecast(ColumnStore):
+    """ The latest published forecast, looked up by inventory id """
+    table = 'forecast'
+    _opened = {}  # root: Forecast, kept per process so requests reuse its open maps
+
+    def __init__(self, root=None):
+        super().__init__(root or settings.FORECAST_DIR)
+
+    @classmethod
+    def current(cls, root=None):
+        """ The latest forecast, or None before the first run; reopened only once CURRENT moves """
+        root = Path(root or settings.FORECAST_DIR)
+        try:
+            version = (root / 'CURRENT').read_text().strip()
+        except FileNotFoundError:
+            return None
+        opened = cls._opened.get(root)
+        if opened is None or opened.path.name != version:
+            opened = cls._opened[root] = cls(root)
+        return opened
+
+    def index_of(self, inventory_id):
+        ids = self['inventory_id']
+        position = int(np.searchsorted(ids, inventory_id))
+        return position if position < len(ids) and ids[position] == inventory_id else None
+
+    def entries(self, positions):
+        """ Result rows at `positions` as JSON-ready dicts (no cover when there is no demand) """
+        values = {name: np.asarray(self[name][positions]).tolist() for name in RESULT_COLUMNS}
+        entries = []
+        for row in zip(*values.values()):
+            entry = dict(zip(RESULT_COLUMNS, row))
+            for name in ('sma', 'ewma', 'std', 'safety_stock', 'reorder_point', 'days_of_cover'):
+                entry[name] = None if entry[name] == float('inf') else round(entry[name], 2)
+            entries.append(entry)
+        return entries
+
+    def reorder_positions(self):
+        """ Positions of SKUs with a suggested order, the ones running out soonest first """
+        positions = np.flatnonzero(np.asarray(self['suggested_order']) > 0)
+        return positions[np.argsort(np.asarray(self['days_of_cover'])[positions], kind='stable')]
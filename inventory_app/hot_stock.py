@@ -0,0 +1,323 @@
+"""
+Write-coalescing stock counters for hot SKUs.
+
+For inventory ids listed in HOT_SKU_IDS the authoritative available count lives
+in the cache and is changed with atomic decrement-if-sufficient operations.
+Every change is also added to a pending delta, which `flush()` moves into the
+database in batches:
+
+1. `claim` atomically turns the pending delta into an in-flight batch numbered
+   `Inventory.hot_flush_seq + 1` (or returns the unapplied batch left by a
+   crashed flusher).
+2. The batch is applied with a single conditional UPDATE guarded by
+   `hot_flush_seq < seq`, so replaying a batch is a no-op.
+
+Decrements are also counted as demand, which `flush()` adds to DailyDemand for
+the day it runs on.
+
+Run `manage.py flush_hot_stock` next to the app to keep the database current.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .redis_utils import get_redis_client, local_lock, register_script
+
+NOT_SEEDED = -2
+INSUFFICIENT = -1
+
+# KEYS: available, pending, demand
+DECREMENT_SCRIPT = """
+local available = redis.call('GET', KEYS[1])
+if not available then return -2 end
+if tonumber(available) < tonumber(ARGV[1]) then return -1 end
+redis.call('INCRBY', KEYS[2], ARGV[1])
+redis.call('INCRBY', KEYS[3], ARGV[1])
+return redis.call('DECRBY', KEYS[1], ARGV[1])
+"""
+
+INCREMENT_SCRIPT = """
+if not redis.call('GET', KEYS[1]) then return -2 end
+redis.call('DECRBY', KEYS[2], ARGV[1])
+return redis.call('INCRBY', KEYS[1], ARGV[1])
+"""
+
+# KEYS: available, pending, in-flight hash; ARGV: db quantity, db flush seq
+SEED_SCRIPT = """
+local pending = tonumber(redis.call('GET', KEYS[2]) or '0')
+local seq = tonumber(redis.call('HGET', KEYS[3], 'seq') or '0')
+local available = tonumber(ARGV[1]) - pending
+if seq > tonumber(ARGV[2]) then
+    available = available - tonumber(redis.call('HGET', KEYS[3], 'delta'))
+end
+redis.call('SET', KEYS[1], available, 'NX')
+return tonumber(redis.call('GET', KEYS[1]))
+"""
+
+# KEYS: pending, in-flight hash; ARGV: db flush seq
+CLAIM_SCRIPT = """
+local seq = tonumber(redis.call('HGET', KEYS[2], 'seq') or '0')
+if seq > tonumber(ARGV[1]) then
+    return {seq, tonumber(redis.call('HGET', KEYS[2], 'delta'))}
+end
+local pending = tonumber(redis.call('GET', KEYS[1]) or '0')
+if pending == 0 then return false end
+seq = tonumber(ARGV[1]) + 1
+redis.call('HSET', KEYS[2], 'seq', seq, 'delta', pending)
+redis.call('DECRBY', KEYS[1], pending)
+return {seq, pending}
+"""
+
+TAKE_DEMAND_SCRIPT = """
+local demand = tonumber(redis.call('GET', KEYS[1]) or '0')
+redis.call('DEL', KEYS[1])
+return demand
+"""
+
+# KEYS: available; ARGV: value read by reconcile, repaired value
+RESET_SCRIPT = """
+local available = redis.call('GET', KEYS[1])
+if not available or tonumber(available) ~= tonumber(ARGV[1]) then return 0 end
+redis.call('SET', KEYS[1], ARGV[2])
+return 1
+"""
+
+STATE_SCRIPT = """
+return {
+    redis.call('GET', KEYS[1]) or false,
+    tonumber(redis.call('GET', KEYS[2]) or '0'),
+    tonumber(redis.call('HGET', KEYS[3], 'seq') or '0'),
+    tonumber(redis.call('HGET', KEYS[3], 'delta') or '0'),
+}
+"""
+
+
+def is_hot(inventory_id):
+    return int(inventory_id) in settings.HOT_SKU_IDS
+
+
+def _keys(inventory_id):
+    return (f'hot_stock_{inventory_id}', f'hot_stock_pending_{inventory_id}', f'hot_stock_inflight_{inventory_id}')
+
+
+def _demand_key(inventory_id):
+    return f'hot_stock_demand_{inventory_id}'
+
+
+class RedisCounters:
+    """ Counters kept as plain Redis integers, each operation one Lua round trip """
+
+    def _run(self, source, keys, args=()):
+        script = register_script(source)
+        return script(keys=[cache.make_key(key) for key in keys], args=list(args))
+
+    def decrement(self, inventory_id, amount):
+        available, pending, _ = _keys(inventory_id)
+        return self._run(DECREMENT_SCRIPT, [available, pending, _demand_key(inventory_id)], [amount])
+
+    def increment(self, inventory_id, amount):
+        available, pending, _ = _keys(inventory_id)
+        return self._run(INCREMENT_SCRIPT, [available, pending], [amount])
+
+    def seed(self, inventory_id, quantity, flush_seq):
+        return self._run(SEED_SCRIPT, _keys(inventory_id), [quantity, flush_seq])
+
+    def claim(self, inventory_id, flush_seq):
+        _, pending, in_flight = _keys(inventory_id)
+        batch = self._run(CLAIM_SCRIPT, [pending, in_flight], [flush_seq])
+        return tuple(batch) if batch else None
+
+    def take_demand(self, inventory_id):
+        return self._run(TAKE_DEMAND_SCRIPT, [_demand_key(inventory_id)])
+
+    def state(self, inventory_id):
+        available, pending, seq, delta = self._run(STATE_SCRIPT, _keys(inventory_id))
+        return (None if available is None else int(available)), pending, seq, delta
+
+    def reset(self, inventory_id, cached, value):
+        return bool(self._run(RESET_SCRIPT, _keys(inventory_id)[:1], [cached, value]))
+
+    def clear(self, inventory_id):
+        self._run("return redis.call('DEL', unpack(KEYS))", _keys(inventory_id) + (_demand_key(inventory_id),))
+
+
+class LocalCounters:
+    """ In-process stand-in for RedisCounters on top of any Django cache """
+
+    def decrement(self, inventory_id, amount):
+        available, pending, _ = _keys(inventory_id)
+        with local_lock:
+            value = cache.get(available)
+            if value is None:
+                return NOT_SEEDED
+            if value < amount:
+                return INSUFFICIENT
+            demand = _demand_key(inventory_id)
+            cache.set_many({available: value - amount, pending: cache.get(pending, 0) + amount,
+                            demand: cache.get(demand, 0) + amount}, timeout=None)
+            return value - amount
+
+    def increment(self, inventory_id, amount):
+        available, pending, _ = _keys(inventory_id)
+        with local_lock:
+            value = cache.get(available)
+            if value is None:
+                return NOT_SEEDED
+            cache.set_many({available: value + amount, pending: cache.get(pending, 0) - amount}, timeout=None)
+            return value + amount
+
+    def seed(self, inventory_id, quantity, flush_seq):
+        available, pending, in_flight = _keys(inventory_id)
+        with local_lock:
+            value = cache.get(available)
+            if value is None:
+                seq, delta = cache.get(in_flight, (0, 0))
+                value = quantity - cache.get(pending, 0) - (delta if seq > flush_seq else 0)
+                cache.set(available, value, timeout=None)
+            return value
+
+    def claim(self, inventory_id, flush_seq):
+        _, pending, in_flight = _keys(inventory_id)
+        with local_lock:
+            seq, delta = cache.get(in_flight, (0, 0))
+            if seq > flush_seq:
+                return seq, delta
+            delta = cache.get(pending, 0)
+            if delta == 0:
+                return None
+            batch = (flush_seq + 1, delta)
+            cache.set_many({in_flight: batch, pending: 0}, timeout=None)
+            return batch
+
+    def take_demand(self, inventory_id):
+        with local_lock:
+            demand = cache.get(_demand_key(inventory_id), 0)
+            cache.delete(_demand_key(inventory_id))
+            return demand
+
+    def state(self, inventory_id):
+        available, pending, in_flight = _keys(inventory_id)
+        with local_lock:
+            seq, delta = cache.get(in_flight, (0, 0))
+            return cache.get(available), cache.get(pending, 0), seq, delta
+
+    def reset(self, inventory_id, cached, value):
+        available = _keys(inventory_id)[0]
+        with local_lock:
+            if cache.get(available) != cached:
+                return False
+            cache.set(available, value, timeout=None)
+            return True
+
+    def clear(self, inventory_id):
+        cache.delete_many(list(_keys(inventory_id)) + [_demand_key(inventory_id)])
+
+
+def get_counters():
+    return LocalCounters() if get_redis_client() is None else RedisCounters()
+
+
+def seed(inventory_id):
+    """ Load the available count from the database unless the cache already has it """
+    from .models import Inventory
+
+    # The row lock keeps a concurrent flush from applying a batch between our reads
+    with transaction.atomic():
+        quantity, flush_seq = (Inventory.objects.select_for_update()
+                               .values_list('quantity', 'hot_flush_seq').get(id=inventory_id))
+        return get_counters().seed(inventory_id, quantity, flush_seq)
+
+
+def available(inventory_id):
+    value = get_counters().state(inventory_id)[0]
+    return seed(inventory_id) if value is None else value
+
+
+def decrease(inventory_id, amount):
+    """ Take `amount` units if available and return what is left """
+    counters = get_counters()
+    remaining = counters.decrement(inventory_id, amount)
+    if remaining == NOT_SEEDED:
+        seed(inventory_id)
+        remaining = counters.decrement(inventory_id, amount)
+    if remaining == INSUFFICIENT:
+        raise ValidationError("Not enough stock available")
+    return remaining
+
+
+def increase(inventory_id, amount):
+    counters = get_counters()
+    remaining = counters.increment(inventory_id, amount)
+    if remaining == NOT_SEEDED:
+        seed(inventory_id)
+        remaining = counters.increment(inventory_id, amount)
+    return remaining
+
+
+def flush(inventory_id):
+    """ Apply the accumulated delta of one SKU to the database, returning the units applied """
+    from .models import DailyDemand, Inventory
+
+    flush_seq = Inventory.objects.filter(id=inventory_id).values_list('hot_flush_seq', flat=True).first()
+    if flush_seq is None:
+        return 0
+    counters = get_counters()
+    # Demand is a forecasting signal, not stock: a flusher dying right here loses it rather than double counting
+    demand = counters.take_demand(inventory_id)
+    if demand:
+        DailyDemand.record(inventory_id, demand)
+    batch = counters.claim(inventory_id, flush_seq)
+    if batch is None:
+        return 0
+    seq, delta = batch
+    Inventory.objects.filter(id=inventory_id, hot_flush_seq__lt=seq).update(
+        quantity=F('quantity') - delta, hot_flush_seq=seq, updated_at=timezone.now())
+    return delta
+
+
+def release(inventory_id):
+    """ Flush everything and drop the cached counters, after removing a SKU from HOT_SKU_IDS """
+    while flush(inventory_id):
+        pass
+    get_counters().clear(inventory_id)
+
+
+def forget(inventory_ids):
+    """ Drop the counters of deleted SKUs; they are stored without a timeout and would stay forever """
+    counters = get_counters()
+    for inventory_id in inventory_ids:
+        if is_hot(inventory_id):
+            counters.clear(inventory_id)
+
+
+def reconcile(inventory_id, repair=False):
+    """
+    Check that the cached count equals the database quantity minus unflushed deltas.
+    With `repair`, a drifted cached count is reset to the expected value, unless
+    a stock change landed after it was read: the report then says "retry".
+    """
+    from .models import Inventory
+
+    counters = get_counters()
+    with transaction.atomic():
+        quantity, flush_seq = (Inventory.objects.select_for_update()
+                               .values_list('quantity', 'hot_flush_seq').get(id=inventory_id))
+        cached, pending, seq, delta = counters.state(inventory_id)
+        in_flight = delta if seq > flush_seq else 0
+        expected = quantity - pending - in_flight
+        report = {
+            "inventory_id": inventory_id,
+            "database": quantity,
+            "pending": pending,
+            "in_flight": in_flight,
+            "cached": cached,
+            "expected": expected,
+            "ok": cached is None or cached == expected,
+        }
+        if repair and not report["ok"]:
+            # The row lock does not hold back decrements, so only write over the value we checked
+            report["repair"] = "reset" if counters.reset(inventory_id, cached, expected) else "retry"
+    return report
@@ -0,0 +1,128 @@
+"""
+`Idempotency-Key` support for unsafe requests that scanners retry.
+
+The first request with a key claims it with an in-flight marker and runs; its
+response is stored in the cache for IDEMPOTENCY_TTL and replayed for every
+retry with the same key, without running the view again. A duplicate that
+arrives while the first one is still running waits for its result (up to
+IDEMPOTENCY_WAIT_SECONDS, then 409). Reusing a key for a different request is
+rejected with 422.
+
+The lookup and the claim are one round trip: a Lua GET-or-SET on Redis,
+`cache.add` (atomic on every Django backend) on others. Responses are stored unless they are
+server errors, so a failed attempt can be retried.
+"""
+import functools
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from .redis_utils import register_script
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+IN_FLIGHT = 'in_flight'
+DONE = 'done'
+POLL_SECONDS = 0.05
+
+# KEYS: entry; ARGV: encoded in-flight marker, marker TTL (ms). Returns the existing entry, or false once claimed
+CLAIM_SCRIPT = """
+local entry = redis.call('GET', KEYS[1])
+if entry then return entry end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return false
+"""
+
+
+def cache_key(request, key):
+    """ Keys are scoped to the client and the endpoint, so clients cannot collide or replay each other """
+    client = request.user.pk if request.user and request.user.is_authenticated else 'anon'
+    digest = hashlib.sha256(f'{request.method} {request.path} {key}'.encode()).hexdigest()[:32]
+    return f'idempotency_{client}_{digest}'
+
+
+def fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()[:16]
+
+
+def claim(entry_key, marker):
+    """ The stored entry for `entry_key`, or None after claiming it with `marker` """
+    lock_ms = settings.IDEMPOTENCY_LOCK_SECONDS * 1000
+    script = register_script(CLAIM_SCRIPT)
+    if script is None:
+        while not cache.add(entry_key, marker, timeout=settings.IDEMPOTENCY_LOCK_SECONDS):
+            entry = cache.get(entry_key)
+            # None means the entry expired between the two calls: try to claim it again
+            if entry is not None:
+                return entry
+        return None
+    client = cache.client
+    entry = script(keys=[cache.make_key(entry_key)], args=[client.encode(marker), lock_ms])
+    return None if entry is None else client.decode(entry)
+
+
+def wait_for_result(entry_key, marker):
+    """
+    Poll a key whose request is in flight. Returns its finished entry, None once
+    the key was claimed for us (the first request died and its marker expired),
+    or the in-flight marker if it is still running after IDEMPOTENCY_WAIT_SECONDS.
+    """
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    entry = marker
+    while time.monotonic() < deadline:
+        time.sleep(POLL_SECONDS)
+        entry = claim(entry_key, marker)
+        if entry is None or entry[0] == DONE:
+            return entry
+    return entry
+
+
+def replay(entry):
+    _, _, status_code, data = entry
+    return Response(data, status=status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(view_method):
+    """ Make an APIView handler honour the Idempotency-Key header """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view_method(self, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({"error": f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        entry_key = cache_key(request, key)
+        request_fingerprint = fingerprint(request)
+        marker = (IN_FLIGHT, request_fingerprint)
+        entry = claim(entry_key, marker)
+        if entry is not None and entry[0] == IN_FLIGHT and entry[1] == request_fingerprint:
+            entry = wait_for_result(entry_key, marker)
+        if entry is not None and entry[1] != request_fingerprint:
+            return Response({"error": f"{HEADER} was already used for a different request."},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if entry is not None and entry[0] == IN_FLIGHT:
+            return Response({"error": f"A request with this {HEADER} is still in progress."},
+                            status=status.HTTP_409_CONFLICT)
+        if entry is not None:
+            return replay(entry)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            cache.delete(entry_key)
+            raise
+        if response.status_code >= 500:
+            cache.delete(entry_key)
+        else:
+            cache.set(entry_key, (DONE, request_fingerprint, response.status_code, response.data),
+                      timeout=settings.IDEMPOTENCY_TTL)
+        return response
+    return wrapper
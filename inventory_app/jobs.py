@@ -0,0 +1,193 @@
+"""
+Background jobs for heavy catalog operations.
+
+`enqueue()` stores a Job row and publishes its id on a kombu queue
+(JOBS_BROKER_URL; Redis in production, memory:// in tests). `manage.py run_jobs`
+consumes the queue and runs each job in a process pool. Handlers are
+registered with `@task` in tasks.py and must be idempotent: a job is retried up
+to `max_attempts` times, and a job whose worker stopped heartbeating for
+JOBS_STALE_SECONDS is queued again. So is a job whose message could not be
+published: a broker outage does not fail the request that queued it.
+"""
+import inspect
+import logging
+import multiprocessing
+import socket
+import time
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from kombu import Connection, Exchange, Queue
+from kombu.exceptions import KombuError
+from kombu.pools import producers
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+VALIDATORS = {}
+
+# Give up on an unreachable broker within a couple of seconds; requeue_stale publishes the job later
+PUBLISH_RETRY_POLICY = {'max_retries': 2, 'interval_start': 0, 'interval_step': 0.5, 'interval_max': 1}
+
+
+def task(name, validate=None):
+    """
+    Register `func(job, **args)` as the handler for jobs called `name`.
+    `validate(**args)` can reject arguments the handler would fail on.
+    """
+    def register(func):
+        TASKS[name] = func
+        if validate:
+            VALIDATORS[name] = validate
+        return func
+    return register
+
+
+def check_args(name, args):
+    """ Raise TypeError or ValueError when `args` cannot run the `name` handler """
+    inspect.signature(TASKS[name]).bind(None, **args)
+    if name in VALIDATORS:
+        VALIDATORS[name](**args)
+
+
+def get_queue():
+    return Queue(settings.JOBS_QUEUE, Exchange(settings.JOBS_QUEUE, type='direct'), routing_key=settings.JOBS_QUEUE)
+
+
+def publish(job_id):
+    """ Publish a job id on the queue; returns False when the broker cannot be reached """
+    queue = get_queue()
+    connection = Connection(settings.JOBS_BROKER_URL, connect_timeout=2)
+    try:
+        with producers[connection].acquire(block=True, timeout=2) as producer:
+            producer.publish({"job_id": str(job_id)}, exchange=queue.exchange, routing_key=queue.routing_key,
+                             serializer='json', declare=[queue], retry=True, retry_policy=PUBLISH_RETRY_POLICY)
+    except (KombuError, OSError):
+        logger.exception("Could not publish job %s; it is queued again after JOBS_STALE_SECONDS", job_id)
+        return False
+    return True
+
+
+def enqueue(name, args=None, max_attempts=None):
+    if name not in TASKS:
+        raise KeyError(name)
+    check_args(name, args or {})
+    job = Job.objects.create(name=name, args=args or {}, max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS)
+    # Publish after commit so the worker can always see the row
+    transaction.on_commit(lambda: publish(job.id))
+    return job
+
+
+def claim(job_id):
+    """ Mark a job running unless another worker holds it; returns the job or None """
+    stale = timezone.now() - timedelta(seconds=settings.JOBS_STALE_SECONDS)
+    claimed = (Job.objects.filter(id=job_id)
+               .filter(Q(status=Job.QUEUED) | Q(status=Job.RUNNING, updated_at__lt=stale))
+               .update(status=Job.RUNNING, attempts=F('attempts') + 1, updated_at=timezone.now()))
+    return Job.objects.get(id=job_id) if claimed else None
+
+
+def run_job(job_id):
+    """
+    Run one job to completion; duplicate deliveries of a finished or held job
+    are no-ops. Returns Job.QUEUED when the job should be retried: the worker
+    publishes it again, since a pool child cannot reach an in-memory broker.
+    """
+    job = claim(job_id)
+    if job is None:
+        return None
+    try:
+        result = TASKS[job.name](job, **job.args)
+    except Exception:
+        logger.exception("Job %s (%s) failed on attempt %s", job.id, job.name, job.attempts)
+        retry = job.attempts < job.max_attempts
+        Job.objects.filter(id=job.id).update(
+            status=Job.QUEUED if retry else Job.FAILED, error=traceback.format_exc(), updated_at=timezone.now())
+        return Job.QUEUED if retry else Job.FAILED
+
+    Job.objects.filter(id=job.id).update(
+        status=Job.SUCCEEDED, progress=100, result=result, error='', updated_at=timezone.now())
+    return Job.SUCCEEDED
+
+
+def requeue_stale():
+    """ Publish again jobs left running by a dead worker, or queued without a message """
+    stale = timezone.now() - timedelta(seconds=settings.JOBS_STALE_SECONDS)
+    job_ids = list(Job.objects.filter(status__in=[Job.QUEUED, Job.RUNNING], updated_at__lt=stale)
+                   .values_list('id', flat=True))
+    for job_id in job_ids:
+        publish(job_id)
+    return len(job_ids)
+
+
+class InlineExecutor:
+    """ Runs jobs in the consumer process (concurrency 0), for tests and debugging """
+
+    def submit(self, func, *args):
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class JobWorker:
+    def __init__(self, concurrency=None):
+        self.concurrency = settings.JOBS_CONCURRENCY if concurrency is None else concurrency
+        self.running = []  # (future, message)
+        self.last_reaped = 0
+
+    def make_executor(self):
+        if self.concurrency == 0:
+            return InlineExecutor()
+        # Spawned children set Django up before unpickling run_job, and open their own connections
+        connections.close_all()
+        return ProcessPoolExecutor(max_workers=self.concurrency, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=django.setup)
+
+    def on_message(self, body, message):
+        self.running.append((self.executor.submit(run_job, body["job_id"]), message))
+
+    def collect(self):
+        # Ack only once a job has finished, so a crashed worker's messages are redelivered
+        for future, message in [entry for entry in self.running if entry[0].done()]:
+            self.running.remove((future, message))
+            try:
+                if future.result() == Job.QUEUED:
+                    publish(message.payload["job_id"])
+            except Exception:
+                logger.exception("Worker process failed")
+            message.ack()
+
+    def run(self, burst=False, idle_timeout=1.0):
+        """ Consume jobs until interrupted; with `burst`, stop once the queue is drained """
+        self.executor = self.make_executor()
+        with Connection(settings.JOBS_BROKER_URL) as connection:
+            with connection.Consumer(get_queue(), callbacks=[self.on_message], accept=['json']) as consumer:
+                consumer.qos(prefetch_count=max(self.concurrency, 1))
+                try:
+                    while True:
+                        if time.monotonic() - self.last_reaped > settings.JOBS_STALE_SECONDS:
+                            self.last_reaped = time.monotonic()
+                            requeue_stale()
+                        try:
+                            connection.drain_events(timeout=idle_timeout)
+                        except socket.timeout:
+                            if burst and not self.running:
+                                break
+                        self.collect()
+                finally:
+                    self.executor.shutdown(wait=True)
+                    self.collect()
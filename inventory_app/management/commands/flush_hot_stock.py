@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from inventory_app import hot_stock
+
+
+class Command(BaseCommand):
+    help = "Flush batched hot-SKU stock deltas from the cache into the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', type=int, nargs='+', help="Inventory ids to process (default: HOT_SKU_IDS)")
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Keep flushing every INTERVAL seconds instead of running once")
+        parser.add_argument('--check', action='store_true', help="Reconcile cache and database after flushing")
+        parser.add_argument('--repair', action='store_true', help="With --check, reset drifted cached counts")
+        parser.add_argument('--release', action='store_true',
+                            help="Flush everything and drop the cached counters (SKU leaving hot mode)")
+
+    def handle(self, *args, **options):
+        inventory_ids = options['ids'] or sorted(settings.HOT_SKU_IDS)
+        while True:
+            for inventory_id in inventory_ids:
+                if options['release']:
+                    hot_stock.release(inventory_id)
+                    self.stdout.write(f"inventory {inventory_id}: released")
+                    continue
+                # A second pass picks up newer deltas left behind by a replayed batch
+                for _ in range(2):
+                    applied = hot_stock.flush(inventory_id)
+                    if not applied:
+                        break
+                    self.stdout.write(f"inventory {inventory_id}: quantity changed by {-applied:+d}")
+                if options['check']:
+                    report = hot_stock.reconcile(inventory_id, repair=options['repair'])
+                    style = self.style.SUCCESS if report['ok'] else self.style.ERROR
+                    self.stdout.write(style(
+                        f"inventory {inventory_id}: cached={report['cached']} expected={report['expected']} "
+                        f"(database={report['database']} pending={report['pending']} "
+                        f"in_flight={report['in_flight']})"
+                        + (f" repair={report['repair']}" if 'repair' in report else '')))
+            if not options['interval'] or options['release']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from inventory_app import forecasting
+
+
+class Command(BaseCommand):
+    help = "Forecast daily demand and suggest reorder quantities for every SKU (FORECAST_DIR)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.FORECAST_HISTORY_DAYS,
+                            help="Days of demand history to use, up to yesterday")
+        parser.add_argument('--dir', help="Forecast directory (default: FORECAST_DIR)")
+
+    def handle(self, *args, **options):
+        stats = forecasting.run_forecast(options['dir'], options['days'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Forecast {stats['version']}: {stats['skus']} SKUs from {stats['demand_rows']} demand rows, "
+            f"{stats['reorder']} to reorder, in {stats['seconds']}s"))
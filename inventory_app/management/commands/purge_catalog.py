@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory_app import purge
+from inventory_app.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = "Delete categories or products with their inventory in short batches, without one long cascading delete"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--category', type=int, help="Category id to purge, with all its products")
+        parser.add_argument('--products', type=int, nargs='+', help="Product ids to purge")
+        parser.add_argument('--batch-size', type=int, default=purge.BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=purge.PAUSE, help="Seconds to sleep between batches")
+
+    def handle(self, *args, **options):
+        if (options['category'] is None) == (options['products'] is None):
+            raise CommandError("Give either --category or --products.")
+
+        def progress(done, total):
+            self.stdout.write(f"{done}/{total} products", ending='\r')
+
+        if options['category'] is not None:
+            if not Category.objects.filter(id=options['category']).exists():
+                raise CommandError(f"Category {options['category']} does not exist.")
+            stats = purge.purge_category(options['category'], options['batch_size'], options['pause'], progress)
+        else:
+            stats = purge.purge_products(Product.objects.filter(id__in=options['products']),
+                                         options['batch_size'], options['pause'], progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {stats['products']} products and {stats['inventory']} inventory rows in {stats['seconds']}s "
+            f"(longest batch {stats['longest_batch_seconds']}s)"))
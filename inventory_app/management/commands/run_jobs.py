@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from inventory_app.jobs import JobWorker
+
+
+class Command(BaseCommand):
+    help = "Consume the job queue and run jobs in a process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help="Worker processes (default: JOBS_CONCURRENCY; 0 runs jobs in this process)")
+        parser.add_argument('--burst', action='store_true', help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        worker = JobWorker(concurrency=options['concurrency'])
+        self.stdout.write(f"Running jobs with concurrency {worker.concurrency}")
+        try:
+            worker.run(burst=options['burst'])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from inventory_app import snapshot
+
+
+class Command(BaseCommand):
+    help = "Write or refresh the columnar product/inventory snapshot used for analytics (SNAPSHOT_DIR)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help="Rebuild from scratch instead of applying the rows changed since the last snapshot")
+        parser.add_argument('--dir', help="Snapshot directory (default: SNAPSHOT_DIR)")
+        parser.add_argument('--chunk-size', type=int, default=snapshot.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        write = snapshot.write_snapshot if options['full'] else snapshot.refresh_snapshot
+        stats = write(options['dir'], options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot {stats['version']}: {stats['rows']} products ({stats['changed']} changed, "
+            f"{stats['removed']} removed) in {stats['seconds']}s"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from inventory_app.cache_warming import warm_cache
+
+
+class Command(BaseCommand):
+    help = "Preload product_<id> and inventory_<id> cache entries, e.g. after a deploy or Redis failover"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=None,
+                            help="Only N rows per model: hot SKUs, then recently updated products (default: all)")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--jitter', type=float, default=0.1, help="Spread TTLs by +/- this fraction")
+        parser.add_argument('--refresh', action='store_true', help="Overwrite keys that are already cached")
+        parser.add_argument('--pause', type=float, default=0, help="Seconds to sleep between chunks")
+
+    def handle(self, *args, **options):
+        stats = warm_cache(limit=options['top'], chunk_size=options['chunk_size'], jitter=options['jitter'],
+                           refresh=options['refresh'], pause=options['pause'],
+                           progress=lambda done: self.stdout.write(f"{done} rows", ending='\r'))
+        self.stdout.write(self.style.SUCCESS(
+            f"Warmed {stats['keys']} keys ({stats['skipped']} already cached) in {stats['seconds']}s, "
+            f"{stats['keys_per_second']} keys/sec"))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory_app', '0003_alter_product_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='hot_flush_seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory_app', '0007_inventory_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyDemand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('inventory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_demand', to='inventory_app.inventory')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailydemand',
+            constraint=models.UniqueConstraint(fields=('inventory', 'day'), name='daily_demand_inventory_day'),
+        ),
+    ]
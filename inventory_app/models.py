@@ -1,5 +1,11 @@
-from django.db import models
+import uuid
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from . import hot_stock
 
 class Category(models.Model):
     name = models.CharField(max_length=255, unique=True)
@@ -16,22 +22,90 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Lets purge.purge_category walk a category's products in id order
+        indexes = [models.Index(fields=['category', 'id'], name='product_category_id_idx')]
+
     def __str__(self):
         return self.name
 
 class Inventory(models.Model):
     product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='inventory')
     quantity = models.IntegerField(default=0)
+    # Last hot-stock batch applied to quantity, see hot_stock.flush
+    hot_flush_seq = models.PositiveBigIntegerField(default=0)
+    # Kept current by save(); queryset .update() calls must set it too (snapshot refreshes rely on it)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.product.name} - {self.quantity} units"
     
     def increase_stock(self,amount):
+       if hot_stock.is_hot(self.id):
+           self.quantity = hot_stock.increase(self.id, amount)
+           return
        self.quantity += amount
        self.save()
 
     def decrease_stock(self,amount):
+        if hot_stock.is_hot(self.id):
+            self.quantity = hot_stock.decrease(self.id, amount)
+            return
         if amount > self.quantity:
             raise ValidationError("Not enough stock available")
-        self.quantity -= amount
-        self.save()
+        with transaction.atomic():
+            self.quantity -= amount
+            self.save()
+            DailyDemand.record(self.id, amount)
+
+class DailyDemand(models.Model):
+    """ Units taken out of stock per SKU and day, the input of forecasting.py """
+    inventory = models.ForeignKey(Inventory, on_delete=models.CASCADE, related_name='daily_demand')
+    day = models.DateField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['inventory', 'day'], name='daily_demand_inventory_day')]
+
+    def __str__(self):
+        return f"{self.inventory_id} {self.day}: {self.quantity}"
+
+    @classmethod
+    def record(cls, inventory_id, amount, day=None):
+        """ Add `amount` to the SKU's demand for `day` (today by default) """
+        day = day or timezone.localdate()
+        rows = cls.objects.filter(inventory_id=inventory_id, day=day)
+        if rows.update(quantity=F('quantity') + amount):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(inventory_id=inventory_id, day=day, quantity=amount)
+        except IntegrityError:  # created by a concurrent request in between
+            rows.update(quantity=F('quantity') + amount)
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (SUCCEEDED, 'Succeeded'), (FAILED, 'Failed')]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=100)
+    args = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    progress = models.PositiveSmallIntegerField(default=0)  # percent
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+    def set_progress(self, percent):
+        """ Report progress; also serves as the heartbeat that keeps a running job from being reclaimed """
+        self.progress = max(0, min(100, int(percent)))
+        Job.objects.filter(id=self.id).update(progress=self.progress, updated_at=timezone.now())
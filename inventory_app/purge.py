@@ -0,0 +1,59 @@
+"""
+Deletes categories and products in small batches instead of one cascading
+delete. Django's collector loads every related row into memory and deletes
+them in a single transaction that holds locks on the whole cascade; here each
+batch of products (with their inventory) is its own short transaction, taken in
+(category, id) index order, with a pause in between so requests keep getting
+the locks. Used by `manage.py purge_catalog` and the `purge_category` job.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from . import hot_stock
+from .models import Category, Inventory, Product
+from .utils import chunked_ids
+
+BATCH_SIZE = 500
+PAUSE = 0.05
+
+
+def purge_products(queryset, batch_size=BATCH_SIZE, pause=PAUSE, progress=None):
+    """
+    Delete the products in `queryset` with their inventory, `batch_size` at a
+    time, and drop their product_<id>/inventory_<id> cache entries and hot-stock
+    counters per batch.
+    `progress(done, total)` gets the products deleted so far.
+    """
+    started = time.perf_counter()
+    total = queryset.count()
+    deleted_products = deleted_inventory = 0
+    longest_batch = 0
+    # Keyset pages stay valid while we delete the rows already paged past
+    for product_ids in chunked_ids(queryset, batch_size):
+        batch_started = time.perf_counter()
+        with transaction.atomic():
+            inventory_ids = list(Inventory.objects.filter(product_id__in=product_ids).values_list('id', flat=True))
+            Product.objects.filter(id__in=product_ids).delete()
+        longest_batch = max(longest_batch, time.perf_counter() - batch_started)
+
+        cache.delete_many([f'product_{product_id}' for product_id in product_ids] +
+                          [f'inventory_{inventory_id}' for inventory_id in inventory_ids])
+        hot_stock.forget(inventory_ids)
+        deleted_products += len(product_ids)
+        deleted_inventory += len(inventory_ids)
+        if progress:
+            progress(deleted_products, total)
+        if pause:
+            time.sleep(pause)
+
+    return {"products": deleted_products, "inventory": deleted_inventory,
+            "seconds": round(time.perf_counter() - started, 3), "longest_batch_seconds": round(longest_batch, 3)}
+
+
+def purge_category(category_id, batch_size=BATCH_SIZE, pause=PAUSE, progress=None):
+    """ Purge a category's products in batches, then the (now empty) category itself """
+    stats = purge_products(Product.objects.filter(category_id=category_id), batch_size, pause, progress)
+    Category.objects.filter(id=category_id).delete()
+    return stats
@@ -0,0 +1,27 @@
+import threading
+
+from django.core.cache import cache
+
+# Serializes read-modify-write sequences when the cache is not Redis (locmem in tests)
+local_lock = threading.RLock()
+
+_scripts = {}
+
+
+def get_redis_client():
+    """ Raw client behind a django-redis cache, or None for any other cache backend """
+    client = getattr(cache, 'client', None)
+    if client is None or not hasattr(client, 'get_client'):
+        return None
+    return client.get_client(write=True)
+
+
+def register_script(source):
+    """ Register a Lua script on the Redis cache, or return None for other backends """
+    redis = get_redis_client()
+    if redis is None:
+        return None
+    script = _scripts.get(source)
+    if script is None or script.registered_client is not redis:
+        script = _scripts[source] = redis.register_script(source)
+    return script
@@ -0,0 +1,175 @@
+import hashlib
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+# Cookie set after a successful write; while present, reads stay on the primary
+PIN_COOKIE = 'db_pin_primary'
+
+# True while handling a safe request for a view that opted into replica reads
+_read_from_replica = ContextVar('read_from_replica', default=False)
+# Replica the last read of the request was routed to
+_replica_alias = ContextVar('replica_alias', default=None)
+
+# Per-process replica health state, keyed by database alias
+_ejected_until = {}
+_last_checked = {}
+_probing = set()
+_probing_lock = threading.Lock()
+
+
+def eject_replica(alias, seconds=None):
+    """ Stop routing reads to a replica for `seconds` (REPLICA_EJECT_SECONDS by default) """
+    if seconds is None:
+        seconds = settings.REPLICA_EJECT_SECONDS
+    _ejected_until[alias] = time.monotonic() + seconds
+
+
+def check_replica(alias):
+    """ Probe a replica with a trivial query and eject it if the probe fails """
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except DatabaseError:
+        eject_replica(alias)
+        return False
+    return True
+
+
+def _probe(alias):
+    try:
+        check_replica(alias)
+    finally:
+        # Connections are per thread; this one would otherwise stay open with the finished thread
+        connections[alias].close()
+        with _probing_lock:
+            _probing.discard(alias)
+
+
+def start_probe(alias):
+    """ Check a replica in a background thread, so a replica that hangs does not stall a request """
+    with _probing_lock:
+        if alias in _probing:
+            return
+        _probing.add(alias)
+    threading.Thread(target=_probe, args=(alias,), name=f'probe-{alias}', daemon=True).start()
+
+
+def healthy_replicas():
+    now = time.monotonic()
+    return [alias for alias in settings.DATABASE_REPLICAS if _ejected_until.get(alias, 0) <= now]
+
+
+def pick_replica():
+    replicas = healthy_replicas()
+    random.shuffle(replicas)
+    now = time.monotonic()
+    for alias in replicas:
+        if now - _last_checked.get(alias, 0) >= settings.REPLICA_HEALTH_CHECK_SECONDS:
+            _last_checked[alias] = now
+            start_probe(alias)
+        # Still used while its probe runs; a failed probe or query ejects it
+        if _ejected_until.get(alias, 0) <= now:
+            return alias
+    return None
+
+
+def cache_timeout(timeout):
+    """
+    Timeout for caching rows read in this request. A replica may lag behind a write
+    the pin cookie only hides from the writer, so its rows are cached no longer
+    than REPLICA_PIN_SECONDS.
+    """
+    if _replica_alias.get() is None:
+        return timeout
+    return min(timeout, settings.REPLICA_PIN_SECONDS)
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads from replica-enabled views to a healthy replica and everything
+    else to the primary. Falls back to the primary when no replica is available.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _read_from_replica.get():
+            return 'default'
+        alias = pick_replica()
+        _replica_alias.set(alias)
+        return alias or 'default'
+
+    def db_for_write(self, model, **hints):
+        # Explicit so instances loaded from a replica are never saved back to it
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+
+def pin_key(request):
+    """ Cache key pinning a client without cookies, derived from its Authorization header """
+    authorization = request.headers.get('Authorization')
+    if not authorization:
+        return None
+    return f'db_pin_{hashlib.sha256(authorization.encode()).hexdigest()[:32]}'
+
+
+class ReplicaPinningMiddleware:
+    """
+    Enables replica reads for views with `replica_reads = True` and pins a client
+    to the primary for REPLICA_PIN_SECONDS after a successful write, so it reads
+    its own changes. Clients are pinned by cookie and, for API clients without a
+    cookie jar, by their Authorization header. A replica failing a query is
+    ejected and the request is retried on the primary.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _read_from_replica.set(False)
+        alias_token = _replica_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_from_replica.reset(token)
+            _replica_alias.reset(alias_token)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+            key = pin_key(request)
+            if key:
+                cache.set(key, 1, timeout=settings.REPLICA_PIN_SECONDS)
+        return response
+
+    def is_pinned(self, request):
+        if PIN_COOKIE in request.COOKIES:
+            return True
+        key = pin_key(request)
+        return key is not None and cache.get(key) is not None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        if not getattr(view_class, 'replica_reads', False):
+            return None
+        if request.method in SAFE_METHODS and not self.is_pinned(request):
+            _read_from_replica.set(True)
+            request.replica_view = (view_func, view_args, view_kwargs)
+        return None
+
+    def process_exception(self, request, exception):
+        alias = _replica_alias.get()
+        if not isinstance(exception, DatabaseError) or alias is None or not _read_from_replica.get():
+            return None
+        eject_replica(alias)
+        _read_from_replica.set(False)
+        _replica_alias.set(None)
+        view_func, view_args, view_kwargs = request.replica_view
+        return view_func(request, *view_args, **view_kwargs)
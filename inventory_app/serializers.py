@@ -1,5 +1,11 @@
-from .models import Category,Product,Inventory
-from rest_framework import serializers
+import decimal
+
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .models import Category,Product,Inventory,Job
+from . import jobs
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -7,8 +13,32 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description']
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    Sparse fieldsets: `parse_fields` validates a `?fields=` list, which reaches
+    the query through RowSerializer and cached data through `project_data`.
+    """
+    # Query paths for fields whose source spans a relation
+    related_sources = {}
+
+    @classmethod
+    def parse_fields(cls, raw_fields):
+        """ `?fields=` value as field names in declaration order; raises ValueError on unknown names """
+        requested = {field_name.strip() for field_name in raw_fields.split(',') if field_name.strip()}
+        unknown = requested - set(cls.Meta.fields)
+        if unknown or not requested:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}" if unknown else "No fields given.")
+        return [field_name for field_name in cls.Meta.fields if field_name in requested]
+
+    @staticmethod
+    def project_data(data, fields):
+        """ Cut an already serialized (e.g. cached) representation down to `fields` """
+        return {field_name: data[field_name] for field_name in fields}
+
+
+class ProductSerializer(DynamicFieldsModelSerializer):
     category_name = serializers.CharField(source='category.name', required=True)
+    related_sources = {'category_name': 'category__name'}
 
     class Meta:
         model = Product
@@ -23,11 +53,116 @@ class ProductSerializer(serializers.ModelSerializer):
         product = Product.objects.create(category=category, **validated_data)
         return product
 
-class InventorySerializer(serializers.ModelSerializer):
+class ProductImportSerializer(ProductSerializer):
+    """ Row validation for bulk imports, which upsert by name instead of rejecting existing names """
+
+    class Meta(ProductSerializer.Meta):
+        extra_kwargs = {'name': {'validators': []}}
+
+class InventorySerializer(DynamicFieldsModelSerializer):
     # product = ProductSerializer()
     product_name = serializers.CharField(source='product.name', read_only=True)
+    related_sources = {'product_name': 'product__name'}
 
     class Meta:
         model = Inventory
         fields = ['id', 'product','product_name', 'quantity']
-       
\ No newline at end of file
+        extra_kwargs = {'quantity': {'min_value': 0}}
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'name', 'args', 'status', 'progress', 'result', 'error', 'attempts', 'max_attempts',
+                  'created_at', 'updated_at']
+        read_only_fields = ['id', 'status', 'progress', 'result', 'error', 'attempts', 'created_at', 'updated_at']
+
+    def validate_name(self, value):
+        if value not in jobs.TASKS:
+            raise serializers.ValidationError(f"Unknown job. Choose one of: {', '.join(sorted(jobs.TASKS))}.")
+        return value
+
+    def validate_args(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("args must be an object.")
+        return value
+
+    def validate(self, attrs):
+        try:
+            jobs.check_args(attrs['name'], attrs.get('args') or {})
+        except (TypeError, ValueError) as e:
+            raise serializers.ValidationError({'args': str(e)})
+        return attrs
+
+    def create(self, validated_data):
+        return jobs.enqueue(validated_data['name'], validated_data.get('args'), validated_data.get('max_attempts'))
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.decimal_places is None:
+        return field.to_representation
+    # Same quantize step as DecimalField.quantize, with the context built once
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            return field.to_representation(value)
+        return '{:f}'.format(value.quantize(exponent, rounding=rounding, context=context))
+    return convert
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        if isinstance(value, str) or timezone.is_naive(value):
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+class RowSerializer:
+    """
+    Read-only fast path for a DynamicFieldsModelSerializer. Builds the same dicts
+    straight from values_list() tuples, with one converter per field compiled per
+    call, so no model instances or serializer fields are created per row.
+    """
+
+    def __init__(self, serializer_class, fields=None):
+        self.serializer_class = serializer_class
+        self.fields = list(fields or serializer_class.Meta.fields)
+        self.columns = [serializer_class.related_sources.get(field_name, field_name) for field_name in self.fields]
+
+    def converters(self):
+        # Built per call because the output timezone is the one active for the request
+        serializer_fields = self.serializer_class().fields
+        converters = []
+        for field_name in self.fields:
+            field = serializer_fields[field_name]
+            if isinstance(field, serializers.DecimalField):
+                converters.append((field_name, _decimal_converter(field)))
+            elif isinstance(field, serializers.DateTimeField):
+                converters.append((field_name, _datetime_converter(field)))
+        return converters
+
+    def serialize(self, queryset):
+        field_names = self.fields
+        converters = self.converters()
+        results = []
+        for row in queryset.values_list(*self.columns):
+            item = dict(zip(field_names, row))
+            for field_name, convert in converters:
+                value = item[field_name]
+                if value is not None:
+                    item[field_name] = convert(value)
+            results.append(item)
+        return results
@@ -0,0 +1,247 @@
+"""
+Point-in-time columnar snapshot of the catalog for analytics, so ad-hoc scans
+run on NumPy arrays instead of the production database.
+
+Each snapshot version is a directory under SNAPSHOT_DIR holding one .npy file
+per column (fixed-width integers; prices in cents, times in epoch seconds) and
+a string dictionary: strings.bin with strings.offsets.npy, referenced by int32
+codes. There is one row per product, sorted by product id, joined with its
+inventory (inventory_id 0 when it has none), plus a small categories table.
+CURRENT names the version readers open, and is switched atomically.
+
+`write_snapshot()` builds a full version. `refresh_snapshot()` only reloads
+products whose product or inventory row changed since the last watermark and
+drops deleted rows by comparing id sets. `Snapshot` memory-maps the columns.
+
+    python manage.py snapshot_inventory [--full]
+"""
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .columns import ColumnStore, has_version, save_version
+from .models import Category, Inventory, Product
+from .utils import chunked_rows
+
+FORMAT_VERSION = 1
+CHUNK_SIZE = 10000
+
+PRODUCT_COLUMNS = {
+    'product_id': np.int64,
+    'category_id': np.int64,
+    'name': np.int32,
+    'price_cents': np.int64,
+    'created_at': np.int64,
+    'updated_at': np.int64,
+    'inventory_id': np.int64,
+    'quantity': np.int64,
+    'stock_updated_at': np.int64,
+}
+CATEGORY_COLUMNS = {
+    'category_id': np.int64,
+    'name': np.int32,
+}
+INVENTORY_COLUMNS = ('inventory_id', 'quantity', 'stock_updated_at')
+
+PRODUCT_FIELDS = ('id', 'category_id', 'name', 'price', 'created_at', 'updated_at',
+                  'inventory__id', 'inventory__quantity', 'inventory__updated_at')
+
+
+def _epoch(value):
+    return int(value.timestamp()) if value is not None else 0
+
+
+class StringDictionary:
+    """ Writer side of strings.bin/strings.offsets.npy; equal strings share one code """
+
+    def __init__(self, blob=b'', offsets=None, known=None):
+        self.parts = [bytes(blob)]
+        self.offsets = list(offsets) if offsets is not None else [0]
+        self.size = self.offsets[-1]
+        self.codes = dict(known or {})
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            encoded = value.encode()
+            self.parts.append(encoded)
+            self.size += len(encoded)
+            self.offsets.append(self.size)
+            code = self.codes[value] = len(self.offsets) - 2
+        return code
+
+    def save(self, path):
+        (path / 'strings.bin').write_bytes(b''.join(self.parts))
+        np.save(path / 'strings.offsets.npy', np.array(self.offsets, dtype=np.int64))
+
+
+def product_rows(queryset, strings, chunk_size=CHUNK_SIZE):
+    """ Columns for the products in `queryset`, read in keyset-paginated chunks of plain tuples """
+    chunks = {name: [] for name in PRODUCT_COLUMNS}
+    for rows in chunked_rows(queryset, PRODUCT_FIELDS, chunk_size):
+        (product_ids, category_ids, names, prices, created, updated,
+         inventory_ids, quantities, stock_updated) = zip(*rows)
+        columns = {
+            'product_id': product_ids,
+            'category_id': category_ids,
+            'name': [strings.code(name) for name in names],
+            'price_cents': [int(price.scaleb(2)) for price in prices],
+            'created_at': [_epoch(value) for value in created],
+            'updated_at': [_epoch(value) for value in updated],
+            'inventory_id': [value or 0 for value in inventory_ids],
+            'quantity': [value or 0 for value in quantities],
+            'stock_updated_at': [_epoch(value) for value in stock_updated],
+        }
+        for name, dtype in PRODUCT_COLUMNS.items():
+            chunks[name].append(np.array(columns[name], dtype=dtype))
+    return {name: np.concatenate(parts) if parts else np.empty(0, dtype=PRODUCT_COLUMNS[name])
+            for name, parts in chunks.items()}
+
+
+def category_rows(strings):
+    categories = list(Category.objects.order_by('id').values_list('id', 'name'))
+    return {
+        'category_id': np.array([category_id for category_id, _ in categories], dtype=np.int64),
+        'name': np.array([strings.code(name) for _, name in categories], dtype=np.int32),
+    }
+
+
+def _publish(root, products, categories, strings, meta):
+    meta = {**meta, 'format': FORMAT_VERSION, 'rows': len(products['product_id'])}
+    return save_version(root, {'products': products, 'categories': categories}, meta, write_extra=strings.save)
+
+
+def write_snapshot(root=None, chunk_size=CHUNK_SIZE):
+    """ Snapshot every product, inventory row and category into a new version """
+    started = time.perf_counter()
+    watermark = timezone.now()  # rows changed while reading are picked up again by the next refresh
+    strings = StringDictionary()
+    products = product_rows(Product.objects.all(), strings, chunk_size)
+    categories = category_rows(strings)
+    path = _publish(root or settings.SNAPSHOT_DIR, products, categories, strings,
+                    {'watermark': watermark.isoformat(), 'full': True})
+    return {"version": path.name, "rows": len(products['product_id']), "changed": len(products['product_id']),
+            "removed": 0, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def refresh_snapshot(root=None, chunk_size=CHUNK_SIZE):
+    """
+    New version from the current one plus the products whose product or
+    inventory row changed since its watermark. Deleted products and inventory
+    rows are found by comparing id sets. Falls back to a full snapshot when
+    there is none yet, or when over half of the string dictionary is garbage.
+    """
+    root = Path(root or settings.SNAPSHOT_DIR)
+    if not has_version(root):
+        return write_snapshot(root, chunk_size)
+    current = Snapshot(root)
+    if current.string_garbage() > 0.5:
+        return write_snapshot(root, chunk_size)
+
+    started = time.perf_counter()
+    watermark = timezone.now()
+    since = datetime.fromisoformat(current.meta['watermark'])
+    old = {name: np.asarray(current[name]) for name in PRODUCT_COLUMNS}
+
+    # Old category names keep their codes, so unchanged categories do not grow the dictionary
+    category_names = current.strings(current.column('name', 'categories'))
+    strings = StringDictionary(current.string_blob, current.string_offsets,
+                               known=zip(category_names, current.column('name', 'categories').tolist()))
+    changed = product_rows(Product.objects.filter(Q(updated_at__gte=since) | Q(inventory__updated_at__gte=since)),
+                           strings, chunk_size)
+
+    live_products = np.fromiter(Product.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size),
+                                dtype=np.int64)
+    live_inventory = np.fromiter(Inventory.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size),
+                                 dtype=np.int64)
+    keep = np.isin(old['product_id'], live_products) & ~np.isin(old['product_id'], changed['product_id'])
+    removed = len(old['product_id']) - int(keep.sum()) - int(np.isin(changed['product_id'], old['product_id']).sum())
+
+    products = {name: np.concatenate([old[name][keep], changed[name]]) for name in PRODUCT_COLUMNS}
+    order = np.argsort(products['product_id'], kind='stable')
+    products = {name: values[order] for name, values in products.items()}
+    # Inventory rows deleted without touching their product
+    gone = (products['inventory_id'] != 0) & ~np.isin(products['inventory_id'], live_inventory)
+    for name in INVENTORY_COLUMNS:
+        products[name][gone] = 0
+
+    categories = category_rows(strings)
+    path = _publish(root, products, categories, strings, {'watermark': watermark.isoformat(), 'full': False})
+    return {"version": path.name, "rows": len(products['product_id']), "changed": len(changed['product_id']),
+            "removed": removed, "seconds": round(time.perf_counter() - started, 3)}
+
+
+class Snapshot(ColumnStore):
+    """
+    Read-only access to the current snapshot version. Columns are memory-mapped
+    when it is opened and a scan only pages in the columns it touches; strings
+    are decoded only for the rows a result needs.
+    """
+    table = 'products'
+
+    def __init__(self, root=None):
+        super().__init__(root or settings.SNAPSHOT_DIR)
+        path = self.path / 'strings.bin'
+        self.string_blob = np.memmap(path, dtype=np.uint8, mode='r') if path.stat().st_size else np.empty(0, np.uint8)
+
+    @property
+    def string_offsets(self):
+        return self.column('offsets', 'strings')
+
+    def strings(self, codes):
+        offsets, blob = self.string_offsets, self.string_blob
+        return [bytes(blob[offsets[code]:offsets[code + 1]]).decode() for code in np.asarray(codes).tolist()]
+
+    def string_garbage(self):
+        """ Fraction of the string dictionary no longer referenced by any row """
+        lengths = np.diff(self.string_offsets)
+        if not lengths.sum():
+            return 0.0
+        used = np.union1d(self['name'], self.column('name', 'categories'))
+        return 1 - lengths[used].sum() / lengths.sum()
+
+    def rows(self, where, columns=('product_id', 'name', 'category_id', 'price_cents', 'quantity')):
+        """ Materialize the rows selected by a boolean mask or index array as dicts, names decoded """
+        selected = {name: np.asarray(self[name][where]).tolist() for name in columns}
+        if 'name' in selected:
+            selected['name'] = self.strings(selected['name'])
+        return [dict(zip(columns, values)) for values in zip(*selected.values())]
+
+    def category_index(self):
+        """
+        Position of each row's category in the categories table, or -1 when the
+        table lacks it: categories are read after the products, so one deleted
+        in between is missing.
+        """
+        category_ids, row_categories = self.column('category_id', 'categories'), self['category_id']
+        index = np.searchsorted(category_ids, row_categories)
+        found = index < len(category_ids)
+        found[found] = category_ids[index[found]] == row_categories[found]
+        return np.where(found, index, -1)
+
+    def stock_by_category(self):
+        """ Total units in stock per category name; rows of unknown categories are totalled under None """
+        category_ids = self.column('category_id', 'categories')
+        index, quantity = self.category_index(), self['quantity']
+        known = index >= 0
+        totals = np.bincount(index[known], weights=quantity[known], minlength=len(category_ids))
+        names = self.strings(self.column('name', 'categories'))
+        stock = dict(zip(names, totals.astype(np.int64).tolist()))
+        if not known.all():
+            stock[None] = int(quantity[~known].sum())
+        return stock
+
+    def price_distribution(self, bins=10):
+        """ Product counts per price bucket, as (counts, bucket edges in currency units) """
+        return np.histogram(self['price_cents'] / 100, bins=bins)
+
+    def dead_stock(self, days=90, now=None):
+        """ Mask of rows holding stock whose inventory has not changed for `days` """
+        cutoff = _epoch((now or timezone.now()) - timedelta(days=days))
+        quantity, stock_updated_at = self['quantity'], self['stock_updated_at']
+        return (quantity > 0) & (stock_updated_at < cutoff)
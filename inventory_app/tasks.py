@@ -0,0 +1,113 @@
+"""
+Catalog jobs run by `manage.py run_jobs`. Every handler is safe to run again
+after a partial attempt.
+"""
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from . import forecasting, purge
+from .cache_warming import TARGETS, warm_cache
+from .jobs import task
+from .models import Category, Product
+from .serializers import ProductImportSerializer, ProductSerializer, RowSerializer
+from .utils import chunked_ids
+
+CHUNK_SIZE = 1000
+
+
+def check_export_args(fields=None):
+    if fields is None:
+        return
+    if not isinstance(fields, list):
+        raise ValueError("fields must be a list of field names.")
+    ProductSerializer.parse_fields(','.join(fields))
+
+
+@task('export_products', validate=check_export_args)
+def export_products(job, fields=None):
+    """ Write every product as a JSON array to JOBS_RESULT_DIR/<job id>.json """
+    if fields is not None:
+        fields = ProductSerializer.parse_fields(','.join(fields))
+    rows = RowSerializer(ProductSerializer, fields)
+    total = Product.objects.count()
+    result_dir = Path(settings.JOBS_RESULT_DIR)
+    result_dir.mkdir(parents=True, exist_ok=True)
+    path = result_dir / f'{job.id}.json'
+    partial_path = result_dir / f'{job.id}.json.partial'
+
+    written = 0
+    with open(partial_path, 'w') as out:
+        out.write('[')
+        for ids in chunked_ids(Product.objects.all()):
+            for data in rows.serialize(Product.objects.filter(id__in=ids).order_by('id')):
+                out.write((',' if written else '') + json.dumps(data, cls=DjangoJSONEncoder))
+                written += 1
+            job.set_progress(written * 100 / max(total, 1))
+        out.write(']')
+    os.replace(partial_path, path)
+    return {"rows": written, "file": path.name}
+
+
+def check_import_args(products):
+    if not isinstance(products, list) or not all(isinstance(row, dict) for row in products):
+        raise ValueError("products must be a list of objects.")
+
+
+@task('import_products', validate=check_import_args)
+def import_products(job, products):
+    """ Upsert products by name in batches; invalid rows are reported and skipped """
+    errors = []
+    imported = 0
+    for start in range(0, len(products), CHUNK_SIZE):
+        valid = []
+        for index, row in enumerate(products[start:start + CHUNK_SIZE], start=start):
+            serializer = ProductImportSerializer(data=row)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+            else:
+                errors.append({"row": index, "errors": serializer.errors})
+
+        category_names = {data['category']['name'] for data in valid}
+        Category.objects.bulk_create([Category(name=name) for name in category_names], ignore_conflicts=True)
+        categories = dict(Category.objects.filter(name__in=category_names).values_list('name', 'id'))
+
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                [Product(name=data['name'], category_id=categories[data['category']['name']],
+                         description=data.get('description'), price=data['price']) for data in valid],
+                update_conflicts=True, unique_fields=['name'],
+                update_fields=['category', 'description', 'price', 'updated_at'])
+        product_ids = Product.objects.filter(name__in=[data['name'] for data in valid]).values_list('id', flat=True)
+        cache.delete_many([f'product_{product_id}' for product_id in product_ids])
+
+        imported += len(valid)
+        job.set_progress((start + CHUNK_SIZE) * 100 / len(products))
+    return {"imported": imported, "errors": errors}
+
+
+@task('rebuild_cache')
+def rebuild_cache(job, limit=None):
+    """ Rewrite product_<id> and inventory_<id> cache entries from the database """
+    total = sum(min(model.objects.count(), limit or float('inf')) for _, model, _ in TARGETS)
+    return warm_cache(limit=limit, refresh=True, progress=lambda done: job.set_progress(done * 100 / max(total, 1)))
+
+
+@task('purge_category')
+def purge_category(job, category_id, batch_size=purge.BATCH_SIZE, pause=purge.PAUSE):
+    """ Delete a category with its products and inventory in short batches, dropping their cache entries """
+    stats = purge.purge_category(category_id, batch_size, pause,
+                                 progress=lambda done, total: job.set_progress(done * 100 / max(total, 1)))
+    return {"products": stats["products"], "inventory": stats["inventory"]}
+
+
+@task('forecast_demand')
+def forecast_demand(job, history_days=None):
+    """ Recompute demand forecasts and reorder suggestions for every SKU into FORECAST_DIR """
+    stats = forecasting.run_forecast(history_days=history_days, progress=job.set_progress)
+    return {"version": stats["version"], "skus": stats["skus"], "reorder": stats["reorder"]}
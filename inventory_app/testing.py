@@ -0,0 +1,92 @@
+"""
+Helpers for the endpoint query-budget and latency tests.
+
+Latency baselines live in perf_baselines.json next to this module, normalized by
+a pure-Python calibration loop so they carry over between machines. Record them
+again after an intended change with
+
+    PERF_UPDATE_BASELINES=1 python manage.py test
+
+A test fails when an endpoint takes more than PERF_TOLERANCE (default 3) times
+its baseline.
+"""
+import contextlib
+import json
+import os
+import time
+from pathlib import Path
+
+from django.db import connections
+
+BASELINES_FILE = Path(__file__).resolve().parent / 'perf_baselines.json'
+MIN_BASELINE = 0.1
+
+
+@contextlib.contextmanager
+def count_queries(using='default'):
+    """ Collect the SQL run inside the block; unlike connection.queries it survives request_started """
+    queries = []
+
+    def record(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connections[using].execute_wrapper(record):
+        yield queries
+
+
+def best_time(func, repeat=5):
+    """ Best wall time of `repeat` calls, in seconds """
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _calibration_loop():
+    total = 0
+    for i in range(200_000):
+        total += i % 7
+    return total
+
+
+_calibration = None
+
+
+def calibration():
+    """ Seconds this machine takes for a fixed amount of interpreter work """
+    global _calibration
+    if _calibration is None:
+        _calibration = best_time(_calibration_loop)
+    return _calibration
+
+
+def load_baselines():
+    if not BASELINES_FILE.exists():
+        return {}
+    return json.loads(BASELINES_FILE.read_text())
+
+
+def record_baselines(entries):
+    baselines = {**load_baselines(), **entries}
+    BASELINES_FILE.write_text(json.dumps(dict(sorted(baselines.items())), indent=2) + '\n')
+
+
+class LatencyBaselineMixin:
+    """ TestCase mixin: `assertWithinBaseline(name, func)` times `func` against its recorded baseline """
+
+    def assertWithinBaseline(self, name, func, repeat=5):
+        cost = best_time(func, repeat) / calibration()
+        if os.getenv('PERF_UPDATE_BASELINES'):
+            record_baselines({name: round(cost, 3)})
+            return
+        baseline = load_baselines().get(name)
+        if baseline is None:
+            self.fail(f"No latency baseline for {name}; record it with PERF_UPDATE_BASELINES=1")
+        tolerance = float(os.getenv('PERF_TOLERANCE', 3))
+        # Sub-millisecond endpoints are mostly noise; give them a fixed floor
+        self.assertLessEqual(
+            cost, max(baseline, MIN_BASELINE) * tolerance,
+            f"{name} took {cost:.2f} calibration units, baseline {baseline} (tolerance x{tolerance})")
@@ -1,14 +1,46 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connection, transaction
+from django.db.models.query import QuerySet
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from django.urls import reverse
+from django.utils import timezone
+from kombu.exceptions import OperationalError
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.core.cache import cache
-from .models import Product,Category, Inventory
-from .serializers import ProductSerializer, InventorySerializer
+from .models import Product,Category, DailyDemand, Inventory, Job
+from .serializers import ProductSerializer, InventorySerializer, RowSerializer
+from .views import ProductAPIView
+from . import cache_warming, forecasting, hot_stock, idempotency, jobs, purge, routers, snapshot
+from .cache_warming import warm_cache
+from .testing import LatencyBaselineMixin, count_queries
 
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+@override_settings(CACHES=LOCMEM_CACHES)
 class ProductAPITest(APITestCase):
     def setUp(self):
+        self.user = User.objects.create_user(username="products", password="pass1234")
+        self.client.force_authenticate(self.user)
         self.category = Category.objects.create(name="Electronics")
         self.product = Product.objects.create(
             name="Laptop",
@@ -115,8 +147,11 @@ class ProductAPITest(APITestCase):
         self.assertIsNone(cache.get(cache_key))
 
 
+@override_settings(CACHES=LOCMEM_CACHES)
 class InventoryAPIViewTest(APITestCase):
     def setUp(self):
+        self.user = User.objects.create_user(username="inventory", password="pass1234")
+        self.client.force_authenticate(self.user)
         # Create an inventory item for testing
         self.category = Category.objects.create(name="Test")
         self.product = Product.objects.create(name="Test Product", description="A test product",category=self.category, price=100.00)
@@ -141,7 +176,8 @@ class InventoryAPIViewTest(APITestCase):
 
     def test_create_inventory_item_success(self):
         """ Test creating a new inventory item """
-        data = {"product": self.product.id, "quantity": 20}
+        new_product = Product.objects.create(name="Second Product", category=self.category, price=50.00)
+        data = {"product": new_product.id, "quantity": 20}
         response = self.client.post(reverse('inventory'), data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["message"], "Successfully Inventory created")
@@ -149,7 +185,8 @@ class InventoryAPIViewTest(APITestCase):
 
     def test_create_inventory_item_invalid(self):
         """ Test creating an inventory item with invalid data """
-        data = {"product": self.product.id, "quantity": -5} 
+        new_product = Product.objects.create(name="Second Product", category=self.category, price=50.00)
+        data = {"product": new_product.id, "quantity": -5}
         response = self.client.post(reverse('inventory'), data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("message", response.data)
@@ -157,25 +194,25 @@ class InventoryAPIViewTest(APITestCase):
     def test_increase_stock_success(self):
         """ Test increasing the stock of an inventory item """
         data = {"amount": 5}
-        response = self.client.put(f"{self.inventory_item_url}?action=increase", data)
+        response = self.client.put(self.inventory_item_url_increase, data, format='json')
         self.inventory_item.refresh_from_db()
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["message"], "Successfully increased stock by 5 units.")
-        self.assertEqual(self.inventory_item.stock, 15)
+        self.assertEqual(self.inventory_item.quantity, 15)
 
     def test_decrease_stock_success(self):
         """ Test decreasing the stock of an inventory item """
         data = {"amount": 3}
-        response = self.client.put(f"{self.inventory_item_url}?action=decrease", data)
+        response = self.client.put(self.inventory_item_url_decrease, data, format='json')
         self.inventory_item.refresh_from_db()
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["message"], "Successfully decreased stock by 3 units.")
-        self.assertEqual(self.inventory_item.stock, 7)
+        self.assertEqual(self.inventory_item.quantity, 7)
 
     def test_decrease_stock_insufficient(self):
         """ Test decreasing the stock below zero """
         data = {"amount": 15}  # This will fail as it would reduce stock to negative
-        response = self.client.put(f"{self.inventory_item_url}?action=decrease", data)
+        response = self.client.put(self.inventory_item_url_decrease, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("error", response.data)
 
@@ -190,3 +227,1305 @@ class InventoryAPIViewTest(APITestCase):
         response = self.client.delete(reverse('inventory-detail', kwargs={'item_id': 999}))
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertEqual(response.data, {"error": "Inventory item not found."})
+
+
+class PrimaryReplicaRouterTest(TestCase):
+    def setUp(self):
+        routers._ejected_until.clear()
+        routers._last_checked.clear()
+        self.router = routers.PrimaryReplicaRouter()
+        self.category = Category.objects.create(name="Routing")
+        self.product = Product.objects.create(name="Routed", category=self.category, price=10.00)
+
+    def test_reads_outside_replica_views_use_primary(self):
+        """ Test reads default to the primary unless a view opted in """
+        with override_settings(DATABASE_REPLICAS=['replica_0']):
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica_0'], REPLICA_HEALTH_CHECK_SECONDS=3600)
+    def test_reads_in_replica_views_use_replica(self):
+        """ Test reads go to a replica once enabled for the request """
+        routers._last_checked['replica_0'] = time.monotonic()
+        token = routers._read_from_replica.set(True)
+        try:
+            self.assertEqual(self.router.db_for_read(Product), 'replica_0')
+        finally:
+            routers._read_from_replica.reset(token)
+
+    @override_settings(DATABASE_REPLICAS=['replica_0', 'replica_1'], REPLICA_HEALTH_CHECK_SECONDS=0)
+    def test_unhealthy_replica_is_ejected(self):
+        """ Test a replica failing its health probe is skipped until the ejection expires """
+        def probe(alias):
+            if alias == 'replica_0':
+                routers.eject_replica(alias)
+                return False
+            return True
+
+        token = routers._read_from_replica.set(True)
+        try:
+            with mock.patch.object(routers, 'start_probe', side_effect=probe):
+                for _ in range(10):
+                    self.assertEqual(self.router.db_for_read(Product), 'replica_1')
+            self.assertEqual(routers.healthy_replicas(), ['replica_1'])
+            routers.eject_replica('replica_1')
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+        finally:
+            routers._read_from_replica.reset(token)
+
+    @override_settings(DATABASE_REPLICAS=['replica_0'], REPLICA_HEALTH_CHECK_SECONDS=0)
+    def test_probe_runs_off_the_request(self):
+        """ Test a due health probe runs in the background instead of holding up the read """
+        probing, release = threading.Event(), threading.Event()
+
+        def hanging_probe(alias):
+            probing.set()
+            release.wait(5)
+            routers.eject_replica(alias)
+
+        token = routers._read_from_replica.set(True)
+        try:
+            with mock.patch.object(routers, 'check_replica', side_effect=hanging_probe), \
+                    mock.patch.object(routers, 'connections'):
+                self.assertEqual(self.router.db_for_read(Product), 'replica_0')
+                self.assertTrue(probing.wait(5))
+                release.set()
+                while routers._probing:
+                    time.sleep(0.01)
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+        finally:
+            release.set()
+            routers._read_from_replica.reset(token)
+
+    def test_writes_always_use_primary(self):
+        """ Test instances loaded from a replica are saved to the primary """
+        self.product._state.db = 'replica_0'
+        self.assertEqual(self.router.db_for_write(Product, instance=self.product), 'default')
+
+
+@override_settings(CACHES=LOCMEM_CACHES, DATABASE_REPLICAS=[])
+class ReplicaPinningMiddlewareTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="pinned", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name="Pinning")
+        self.product = Product.objects.create(name="Pinned", category=self.category, price=5.00)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_write_pins_client_to_primary(self):
+        """ Test a successful write sets the read-your-writes cookie """
+        data = {"name": "Pinned 2", "category_name": "Pinning", "price": "6.00"}
+        response = self.client.post(reverse('product-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[routers.PIN_COOKIE]['max-age'], settings.REPLICA_PIN_SECONDS)
+
+    def test_read_does_not_pin(self):
+        """ Test reads do not pin the client """
+        response = self.client.get(reverse('product-detail', kwargs={'product_id': self.product.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+    def test_pinned_client_reads_from_primary(self):
+        """ Test replica reads are enabled only for unpinned safe requests """
+        seen = []
+        view = ProductAPIView.as_view()
+        middleware = routers.ReplicaPinningMiddleware(lambda request: HttpResponse())
+        factory = RequestFactory()
+
+        def run(request):
+            def get_response(request):
+                middleware.process_view(request, view, (), {})
+                seen.append(routers._read_from_replica.get())
+                return HttpResponse()
+            middleware.get_response = get_response
+            middleware(request)
+
+        run(factory.get('/products/'))
+        pinned = factory.get('/products/')
+        pinned.COOKIES[routers.PIN_COOKIE] = '1'
+        run(pinned)
+        run(factory.post('/products/'))
+        self.assertEqual(seen, [True, False, False])
+        self.assertFalse(routers._read_from_replica.get())
+
+    def test_write_pins_authorization_header(self):
+        """ Test clients without cookies are pinned by their Authorization header """
+        view = ProductAPIView.as_view()
+        middleware = routers.ReplicaPinningMiddleware(lambda request: HttpResponse(status=201))
+        factory = RequestFactory()
+        middleware(factory.post('/products/', HTTP_AUTHORIZATION='Bearer scanner'))
+
+        for header, replica in (('Bearer scanner', False), ('Bearer other', True)):
+            request = factory.get('/products/', HTTP_AUTHORIZATION=header)
+            token = routers._read_from_replica.set(False)
+            try:
+                middleware.process_view(request, view, (), {})
+                self.assertEqual(routers._read_from_replica.get(), replica, header)
+            finally:
+                routers._read_from_replica.reset(token)
+
+    def test_replica_rows_are_cached_for_the_pin_window(self):
+        """ Test rows read from a replica are cached no longer than a write pins its client """
+        url = reverse('product-detail', kwargs={'product_id': self.product.id})
+        for replica, timeout in (('default', settings.REPLICA_PIN_SECONDS), (None, cache_warming.CACHE_TIMEOUT)):
+            cache.clear()
+            with mock.patch.object(routers, 'pick_replica', return_value=replica), \
+                    mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+                self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+            self.assertEqual(cache_set.call_args.kwargs['timeout'], timeout, replica)
+
+    @override_settings(DATABASE_REPLICAS=['replica_0'])
+    def test_replica_error_is_retried_on_primary(self):
+        """ Test a read failing on a replica ejects it and is retried on the primary """
+        routers._ejected_until.clear()
+        reads = []
+
+        def view(request):
+            reads.append(routers._read_from_replica.get())
+            if len(reads) == 1:
+                routers._replica_alias.set('replica_0')
+                raise DatabaseError("replica went away")
+            return HttpResponse("ok")
+        view.view_class = ProductAPIView
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            try:
+                return view(request)
+            except DatabaseError as e:
+                return middleware.process_exception(request, e)
+        middleware = routers.ReplicaPinningMiddleware(get_response)
+
+        response = middleware(RequestFactory().get('/products/'))
+        self.assertEqual(response.content, b"ok")
+        self.assertEqual(reads, [True, False])
+        self.assertEqual(routers.healthy_replicas(), [])
+        routers._ejected_until.clear()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class HotStockTest(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Flash Sale")
+        self.product = Product.objects.create(name="Hot Item", category=self.category, price=9.99)
+        self.inventory = Inventory.objects.create(product=self.product, quantity=100)
+        self.hot = override_settings(HOT_SKU_IDS={self.inventory.id})
+        self.hot.enable()
+
+    def tearDown(self):
+        self.hot.disable()
+        cache.clear()
+
+    def test_decrease_is_coalesced_until_flush(self):
+        """ Test hot decreases change the cached count and reach the database on flush """
+        for _ in range(5):
+            self.inventory.decrease_stock(3)
+        self.assertEqual(self.inventory.quantity, 85)
+        self.assertEqual(Inventory.objects.get(id=self.inventory.id).quantity, 100)
+
+        self.assertEqual(hot_stock.flush(self.inventory.id), 15)
+        self.assertEqual(hot_stock.flush(self.inventory.id), 0)
+        self.assertEqual(Inventory.objects.get(id=self.inventory.id).quantity, 85)
+
+    def test_decrease_insufficient(self):
+        """ Test a hot decrease beyond the available count is rejected """
+        self.inventory.decrease_stock(90)
+        with self.assertRaises(ValidationError):
+            self.inventory.decrease_stock(11)
+        self.inventory.increase_stock(1)
+        self.inventory.decrease_stock(11)
+        self.assertEqual(hot_stock.available(self.inventory.id), 0)
+        hot_stock.flush(self.inventory.id)
+        self.assertEqual(Inventory.objects.get(id=self.inventory.id).quantity, 0)
+
+    def test_crashed_flush_is_replayed_once(self):
+        """ Test a batch claimed by a crashed flusher is applied exactly once """
+        self.inventory.decrease_stock(10)
+        hot_stock.get_counters().claim(self.inventory.id, 0)  # flusher dies before the UPDATE
+        self.inventory.decrease_stock(5)
+        self.assertTrue(hot_stock.reconcile(self.inventory.id)["ok"])
+
+        self.assertEqual(hot_stock.flush(self.inventory.id), 10)
+        self.assertEqual(hot_stock.flush(self.inventory.id), 5)
+        # A flusher that read hot_flush_seq before both batches landed replays the first one: a no-op
+        cache.set(f'hot_stock_inflight_{self.inventory.id}', (1, 10), timeout=None)
+        with mock.patch.object(QuerySet, 'first', return_value=0):
+            hot_stock.flush(self.inventory.id)
+        self.assertEqual(Inventory.objects.get(id=self.inventory.id).quantity, 85)
+
+    def test_delete_drops_counters(self):
+        """ Test deleting a hot SKU, directly or by purging its product, drops its cached counters """
+        user = User.objects.create_user(username="hot-delete", password="pass1234")
+        self.client.force_authenticate(user)
+        self.inventory.decrease_stock(4)
+        self.client.delete(reverse('inventory-detail', kwargs={'item_id': self.inventory.id}))
+        self.assertEqual(hot_stock.get_counters().state(self.inventory.id), (None, 0, 0, 0))
+
+        other = Inventory.objects.create(product=Product.objects.create(name="Hot 2", category=self.category,
+                                                                        price=1), quantity=10)
+        with override_settings(HOT_SKU_IDS={other.id}):
+            other.decrease_stock(1)
+            purge.purge_products(Product.objects.filter(id=other.product_id), pause=0)
+            self.assertEqual(hot_stock.get_counters().state(other.id), (None, 0, 0, 0))
+
+    def test_reseed_after_cache_loss_counts_unflushed_batch(self):
+        """ Test the cached count is rebuilt from the row minus deltas still in flight """
+        self.inventory.decrease_stock(10)
+        hot_stock.get_counters().claim(self.inventory.id, 0)
+        cache.delete(f'hot_stock_{self.inventory.id}')
+        self.assertEqual(hot_stock.available(self.inventory.id), 90)
+
+    def test_reconcile_detects_and_repairs_drift(self):
+        """ Test reconciliation reports and fixes a drifted cached count """
+        self.inventory.decrease_stock(10)
+        cache.set(f'hot_stock_{self.inventory.id}', 42, timeout=None)
+        report = hot_stock.reconcile(self.inventory.id, repair=True)
+        self.assertFalse(report["ok"])
+        self.assertEqual((report["expected"], report["repair"]), (90, "reset"))
+        self.assertTrue(hot_stock.reconcile(self.inventory.id)["ok"])
+
+    def test_repair_keeps_concurrent_decrement(self):
+        """ Test a repair racing a decrement leaves the counter alone and asks for a retry """
+        cache.set(f'hot_stock_{self.inventory.id}', 42, timeout=None)
+        state = hot_stock.LocalCounters.state
+
+        def state_then_decrement(counters, inventory_id):
+            result = state(counters, inventory_id)
+            counters.decrement(inventory_id, 2)
+            return result
+
+        with mock.patch.object(hot_stock.LocalCounters, 'state', state_then_decrement):
+            self.assertEqual(hot_stock.reconcile(self.inventory.id, repair=True)["repair"], "retry")
+        self.assertEqual(hot_stock.get_counters().state(self.inventory.id)[:2], (40, 2))
+        hot_stock.reconcile(self.inventory.id, repair=True)
+        self.assertEqual(hot_stock.available(self.inventory.id), 98)
+
+    def test_get_returns_live_count(self):
+        """ Test the inventory endpoint reports the cached count for hot SKUs """
+        user = User.objects.create_user(username="hot", password="pass1234")
+        self.client.force_authenticate(user)
+        url = reverse('inventory-detail', kwargs={'item_id': self.inventory.id})
+        self.assertEqual(self.client.get(url).data["quantity"], 100)
+        self.inventory.decrease_stock(7)
+        self.assertEqual(self.client.get(url).data["quantity"], 93)
+
+    def test_flush_command(self):
+        """ Test the flusher command applies deltas and reconciles """
+        self.inventory.decrease_stock(4)
+        out = StringIO()
+        call_command('flush_hot_stock', '--check', stdout=out)
+        self.assertIn("quantity changed by -4", out.getvalue())
+        self.assertIn("cached=96 expected=96", out.getvalue())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MultiGetTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="multi", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name="Bulk")
+        self.products = [
+            Product.objects.create(name=f"Bulk {index}", category=self.category, price=index + 1)
+            for index in range(5)
+        ]
+        self.items = [Inventory.objects.create(product=product, quantity=10) for product in self.products]
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_products_in_request_order_with_missing(self):
+        """ Test multi-get keeps request order and reports unknown ids """
+        ids = [self.products[3].id, 9999, self.products[0].id]
+        response = self.client.get(reverse('product-list'), {'ids': ','.join(map(str, ids))})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in response.data["results"]], [ids[0], ids[2]])
+        self.assertEqual(response.data["results"][0], ProductSerializer(self.products[3]).data)
+        self.assertEqual(response.data["missing"], [9999])
+
+    def test_products_single_query_then_cache(self):
+        """ Test misses load with one query and are backfilled into the cache """
+        cache.set(f'product_{self.products[0].id}', ProductSerializer(self.products[0]).data)
+        ids = ','.join(str(product.id) for product in self.products)
+        with self.assertNumQueries(1):
+            self.client.get(reverse('product-list'), {'ids': ids})
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('product-list'), {'ids': ids})
+        self.assertEqual(len(response.data["results"]), 5)
+
+    def test_inventory_multi_get(self):
+        """ Test multi-get on inventory items """
+        ids = [self.items[1].id, self.items[4].id, 12345]
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('inventory'), {'ids': ','.join(map(str, ids))})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], [InventorySerializer(self.items[1]).data,
+                                                    InventorySerializer(self.items[4]).data])
+        self.assertEqual(response.data["missing"], [12345])
+
+    def test_invalid_ids(self):
+        """ Test malformed or oversized id lists are rejected """
+        for ids in ['1,abc', '', ','.join(str(index) for index in range(101))]:
+            response = self.client.get(reverse('product-list'), {'ids': ids})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SparseFieldsetTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="sparse", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name="Sparse")
+        self.product = Product.objects.create(name="Slim", category=self.category, description="x" * 1000, price=3.50)
+        self.inventory = Inventory.objects.create(product=self.product, quantity=4)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_list_projection_pushed_to_query(self):
+        """ Test ?fields= trims both the output and the selected columns """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('product-list'), {'fields': 'price,id,name'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{"id": self.product.id, "name": "Slim", "price": "3.50"}])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"description"', queries[0]['sql'])
+        self.assertNotIn('"inventory_app_category"', queries[0]['sql'])
+
+    def test_list_projection_with_relation(self):
+        """ Test a related field joins its table in the same query """
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('product-list'), {'fields': 'id,category_name'})
+        self.assertEqual(response.data, [{"id": self.product.id, "category_name": "Sparse"}])
+
+    def test_detail_projection_keeps_full_cache_entry(self):
+        """ Test a projected detail read caches the full representation """
+        url = reverse('product-detail', kwargs={'product_id': self.product.id})
+        response = self.client.get(url, {'fields': 'id,name'})
+        self.assertEqual(response.data, {"id": self.product.id, "name": "Slim"})
+        self.assertEqual(cache.get(f'product_{self.product.id}'), ProductSerializer(self.product).data)
+        self.assertEqual(self.client.get(url).data, ProductSerializer(self.product).data)
+
+    def test_inventory_projection(self):
+        """ Test ?fields= on inventory detail and multi-get reads """
+        url = reverse('inventory-detail', kwargs={'item_id': self.inventory.id})
+        self.assertEqual(self.client.get(url, {'fields': 'quantity'}).data, {"quantity": 4})
+        response = self.client.get(reverse('inventory'), {'ids': self.inventory.id, 'fields': 'id,product_name'})
+        self.assertEqual(response.data["results"], [{"id": self.inventory.id, "product_name": "Slim"}])
+
+    def test_unknown_field(self):
+        """ Test unknown field names are rejected """
+        response = self.client.get(reverse('product-list'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"error": "Unknown fields: secret"})
+
+
+class RowSerializerParityTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Parity")
+        prices = ["0.10", "1200.00", "99999999.99", "5", "0"]
+        self.products = [
+            Product.objects.create(name=f"Parity {index}", category=self.category,
+                                   description=None if index % 2 else "desc", price=Decimal(price))
+            for index, price in enumerate(prices)
+        ]
+        for product in self.products[:3]:
+            Inventory.objects.create(product=product, quantity=7)
+
+    def test_product_rows_match_model_serializer(self):
+        """ Test the fast path emits exactly what ProductSerializer does """
+        products = Product.objects.order_by('id')
+        expected = ProductSerializer(products, many=True).data
+        self.assertEqual(RowSerializer(ProductSerializer).serialize(products), expected)
+        self.assertEqual(json.dumps(RowSerializer(ProductSerializer).serialize(products), cls=DjangoJSONEncoder),
+                         json.dumps(expected, cls=DjangoJSONEncoder))
+
+    def test_inventory_rows_match_model_serializer(self):
+        """ Test the fast path emits exactly what InventorySerializer does """
+        items = Inventory.objects.order_by('id')
+        self.assertEqual(RowSerializer(InventorySerializer).serialize(items),
+                         InventorySerializer(items, many=True).data)
+
+    def test_parity_in_other_timezone(self):
+        """ Test timestamps follow the active timezone like DRF's DateTimeField """
+        with timezone.override('Asia/Kolkata'):
+            products = Product.objects.order_by('id')
+            rows = RowSerializer(ProductSerializer).serialize(products)
+            self.assertEqual(rows, ProductSerializer(products, many=True).data)
+            self.assertTrue(rows[0]["created_at"].endswith("+05:30"))
+
+    def test_projection(self):
+        """ Test a field subset selects only the matching columns """
+        fields = ["id", "category_name", "price"]
+        with CaptureQueriesContext(connection) as queries:
+            rows = RowSerializer(ProductSerializer, fields).serialize(Product.objects.order_by('id'))
+        self.assertEqual(rows[0], {"id": self.products[0].id, "category_name": "Parity", "price": "0.10"})
+        self.assertNotIn('"description"', queries[0]['sql'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES, JOBS_BROKER_URL='memory://', JOBS_QUEUE='test-jobs')
+class JobTest(APITestCase):
+    def setUp(self):
+        self.result_dir = tempfile.TemporaryDirectory()
+        self.results = override_settings(JOBS_RESULT_DIR=self.result_dir.name)
+        self.results.enable()
+        self.user = User.objects.create_user(username="jobs", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name="Jobs")
+        self.products = [
+            Product.objects.create(name=f"Job {index}", category=self.category, price=index + 1) for index in range(3)
+        ]
+        Inventory.objects.create(product=self.products[0], quantity=3)
+
+    def tearDown(self):
+        self.results.disable()
+        self.result_dir.cleanup()
+        cache.clear()
+
+    def enqueue(self, name, args=None, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return jobs.enqueue(name, args, **kwargs)
+
+    def work(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.JobWorker(concurrency=0).run(burst=True, idle_timeout=0.05)
+
+    def test_enqueue_and_poll_export(self):
+        """ Test a job is queued over HTTP, run by the worker and polled to completion """
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('job-list'), {"name": "export_products"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job_url = reverse('job-detail', kwargs={'job_id': response.data["data"]["id"]})
+        self.assertEqual(self.client.get(job_url).data["status"], Job.QUEUED)
+
+        self.work()
+        job = self.client.get(job_url).data
+        self.assertEqual((job["status"], job["progress"], job["result"]["rows"]), (Job.SUCCEEDED, 100, 3))
+
+        download = self.client.get(reverse('job-download', kwargs={'job_id': job["id"]}))
+        exported = json.loads(b''.join(download.streaming_content))
+        self.assertEqual(exported, json.loads(json.dumps(
+            RowSerializer(ProductSerializer).serialize(Product.objects.order_by('id')), cls=DjangoJSONEncoder)))
+
+    def test_unknown_job(self):
+        """ Test only registered jobs can be queued """
+        response = self.client.post(reverse('job-list'), {"name": "drop_tables"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_args(self):
+        """ Test args the handler cannot run with are rejected before anything is queued """
+        for data in ({"name": "purge_category"},
+                     {"name": "purge_category", "args": {"category_id": 1, "cascade": True}},
+                     {"name": "export_products", "args": {"fields": ["bogus"]}},
+                     {"name": "export_products", "args": {"fields": "id"}},
+                     {"name": "import_products", "args": {}},
+                     {"name": "import_products", "args": {"products": {"name": "Not a list"}}},
+                     {"name": "import_products", "args": {"products": ["Not an object"]}}):
+            with self.subTest(data=data):
+                response = self.client.post(reverse('job-list'), data, format='json')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn("args", response.data["message"])
+        self.assertFalse(Job.objects.exists())
+
+    def test_retry_is_published_by_the_consumer(self):
+        """ Test a failed attempt is handed back to the consumer, which owns the broker connection """
+        with mock.patch.dict(jobs.TASKS, {"broken": mock.Mock(side_effect=RuntimeError("boom"))}):
+            job = self.enqueue("broken")
+            with mock.patch.object(jobs, 'publish') as publish, self.assertLogs('inventory_app.jobs', level='ERROR'):
+                self.assertEqual(jobs.run_job(job.id), Job.QUEUED)
+        publish.assert_not_called()
+
+    def test_broker_down_leaves_job_for_requeue(self):
+        """ Test a job whose message could not be published is still accepted and queued again later """
+        with mock.patch('kombu.messaging.Producer.publish', side_effect=OperationalError("broker down")), \
+                self.assertLogs('inventory_app.jobs', level='ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('job-list'), {"name": "rebuild_cache"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = Job.objects.get(id=response.data["data"]["id"])
+        self.assertEqual(job.status, Job.QUEUED)
+
+        Job.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.work()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+
+    def test_import_is_idempotent(self):
+        """ Test re-running an import upserts instead of duplicating """
+        rows = [
+            {"name": "Job 0", "category_name": "Jobs", "price": "50.00"},
+            {"name": "Imported", "category_name": "New Category", "price": "7.25", "description": "d"},
+            {"name": "Broken", "category_name": "Jobs", "price": "not a price"},
+        ]
+        for _ in range(2):
+            job = self.enqueue('import_products', {"products": rows})
+            self.work()
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.SUCCEEDED)
+            self.assertEqual(job.result["imported"], 2)
+            self.assertEqual([error["row"] for error in job.result["errors"]], [2])
+        self.assertEqual(Product.objects.count(), 4)
+        self.assertEqual(Product.objects.get(name="Job 0").price, Decimal("50.00"))
+        self.assertEqual(Product.objects.get(name="Imported").category.name, "New Category")
+
+    def test_failed_job_is_retried(self):
+        """ Test a failing job is retried until it succeeds or runs out of attempts """
+        calls = []
+
+        def flaky(job):
+            calls.append(job.attempts)
+            if len(calls) < 2:
+                raise RuntimeError("temporary failure")
+            return {"ok": True}
+
+        with mock.patch.dict(jobs.TASKS, {"flaky": flaky, "broken": mock.Mock(side_effect=RuntimeError("boom"))}):
+            flaky_job = self.enqueue("flaky")
+            broken_job = self.enqueue("broken", max_attempts=2)
+            with self.assertLogs('inventory_app.jobs', level='ERROR'):
+                self.work()
+        flaky_job.refresh_from_db()
+        broken_job.refresh_from_db()
+        self.assertEqual((flaky_job.status, flaky_job.attempts, calls), (Job.SUCCEEDED, 2, [1, 2]))
+        self.assertEqual((broken_job.status, broken_job.attempts), (Job.FAILED, 2))
+        self.assertIn("boom", broken_job.error)
+
+    def test_duplicate_delivery_runs_once(self):
+        """ Test a job delivered twice only runs once """
+        handler = mock.Mock(return_value=None)
+        with mock.patch.dict(jobs.TASKS, {"once": handler}):
+            job = self.enqueue("once")
+            jobs.publish(job.id)
+            self.work()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, handler.call_count), (Job.SUCCEEDED, 1, 1))
+
+    def test_stale_running_job_is_reclaimed(self):
+        """ Test a job abandoned by a dead worker is queued again """
+        job = self.enqueue("rebuild_cache")
+        self.work()
+        Job.objects.filter(id=job.id).update(status=Job.RUNNING, updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.work()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.SUCCEEDED, 2))
+        self.assertEqual(cache.get(f'product_{self.products[1].id}'), ProductSerializer(self.products[1]).data)
+
+    def test_purge_category(self):
+        """ Test purging a category removes its products, inventory and cache entries """
+        cache.set(f'product_{self.products[0].id}', {"stale": True})
+        job = self.enqueue("purge_category", {"category_id": self.category.id})
+        self.work()
+        job.refresh_from_db()
+        self.assertEqual(job.result, {"products": 3, "inventory": 1})
+        self.assertFalse(Product.objects.exists())
+        self.assertIsNone(cache.get(f'product_{self.products[0].id}'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES,
+                   TOKEN_BUCKETS={'products': {'rate': 1, 'capacity': 3}, 'login': {'rate': 0.5, 'capacity': 2}},
+                   TOKEN_BUCKET_USER_LIMITS={'bulk': {'products': {'rate': 1, 'capacity': 10}}})
+class TokenBucketThrottleTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="throttled", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.url = reverse('product-list')
+        self.now = 1000.0
+        patcher = mock.patch('inventory_app.throttling.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_burst_then_retry_after(self):
+        """ Test a client gets its burst, then 429 with Retry-After until tokens refill """
+        for _ in range(3):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '1')
+
+        self.now += 1
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_buckets_are_per_user_and_scope(self):
+        """ Test one client's empty bucket does not limit other users or endpoints """
+        for _ in range(4):
+            self.client.get(self.url)
+        self.assertEqual(self.client.get(reverse('inventory'), {'ids': '1'}).status_code, status.HTTP_200_OK)
+
+        self.client.force_authenticate(User.objects.create_user(username="other", password="pass1234"))
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    def test_user_override(self):
+        """ Test per-user limits replace the scope defaults """
+        self.client.force_authenticate(User.objects.create_user(username="bulk", password="pass1234"))
+        for _ in range(10):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_login_is_throttled_by_ip(self):
+        """ Test anonymous login attempts share a bucket per client IP """
+        self.client.force_authenticate(None)
+        data = {"username": "throttled", "password": "wrong"}
+        for _ in range(2):
+            self.assertEqual(self.client.post(reverse('login'), data).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('login'), data)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '2')
+
+    def test_token_endpoint_shares_login_bucket(self):
+        """ Test password checks through /user/token/ cannot bypass the login bucket """
+        self.client.force_authenticate(None)
+        data = {"username": "throttled", "password": "wrong"}
+        self.assertEqual(self.client.post(reverse('login'), data).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(reverse('token_obtain_pair'), data).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.post(reverse('token_obtain_pair'), data).status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_forwarded_for_does_not_pick_the_bucket(self):
+        """ Test a client cannot get a fresh bucket by sending a different X-Forwarded-For """
+        self.client.force_authenticate(None)
+        data = {"username": "throttled", "password": "wrong"}
+        codes = [self.client.post(reverse('login'), data, HTTP_X_FORWARDED_FOR=f"10.0.0.{index}").status_code
+                 for index in range(3)]
+        self.assertEqual(codes[-1], status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class WarmCacheTest(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Warm")
+        self.products = [
+            Product.objects.create(name=f"Warm {index}", category=self.category, price=index) for index in range(5)
+        ]
+        self.items = [Inventory.objects.create(product=product, quantity=index)
+                      for index, product in enumerate(self.products)]
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_entries_match_views(self):
+        """ Test warmed entries are exactly what the views would cache """
+        out = StringIO()
+        call_command('warm_cache', '--chunk-size', '2', stdout=out)
+        self.assertIn("Warmed 10 keys", out.getvalue())
+        for product in self.products:
+            self.assertEqual(cache.get(f'product_{product.id}'), ProductSerializer(product).data)
+        for item in self.items:
+            self.assertEqual(cache.get(f'inventory_{item.id}'), InventorySerializer(item).data)
+
+    def test_chunked_queries(self):
+        """ Test rows are loaded in chunks rather than one query per row """
+        with self.assertNumQueries(6):  # per model: one id page, one row load, one empty id page
+            warm_cache(chunk_size=5)
+
+    def test_top_n_prefers_hot_rows(self):
+        """ Test --top warms hot SKUs, then recently updated rows only """
+        self.products[0].save()  # now the most recently updated
+        with override_settings(HOT_SKU_IDS={self.items[2].id}):
+            stats = warm_cache(limit=1)
+        self.assertEqual(stats["keys"], 2)
+        self.assertIsNotNone(cache.get(f'product_{self.products[0].id}'))
+        self.assertIsNotNone(cache.get(f'inventory_{self.items[2].id}'))
+
+    def test_existing_keys_are_kept(self):
+        """ Test warming does not overwrite entries written while it runs unless refreshing """
+        cache.set(f'product_{self.products[0].id}', {"fresh": True})
+        stats = warm_cache()
+        self.assertEqual((stats["keys"], stats["skipped"]), (9, 1))
+        self.assertEqual(cache.get(f'product_{self.products[0].id}'), {"fresh": True})
+        warm_cache(refresh=True)
+        self.assertEqual(cache.get(f'product_{self.products[0].id}'), ProductSerializer(self.products[0]).data)
+
+    def test_write_during_warming_is_kept(self):
+        """ Test a value cached by a request after warming read the row is not overwritten """
+        key = f'product_{self.products[0].id}'
+        serialize = RowSerializer.serialize
+
+        def request_writes_meanwhile(rows, queryset):
+            data = serialize(rows, queryset)
+            cache.set(key, {"fresh": True})
+            return data
+
+        with mock.patch.object(RowSerializer, 'serialize', request_writes_meanwhile):
+            stats = warm_cache()
+        self.assertEqual(cache.get(key), {"fresh": True})
+        self.assertEqual((stats["keys"], stats["skipped"]), (9, 1))
+
+    def test_ttl_jitter(self):
+        """ Test TTLs are spread across batches around the base timeout """
+        entries = {f'key_{index}': index for index in range(200)}
+        batches = list(cache_warming.jittered(entries, 0.1))
+        timeouts = {timeout for timeout, _ in batches}
+        self.assertGreater(len(timeouts), 1)
+        self.assertTrue(all(810 <= timeout <= 990 for timeout in timeouts))
+        self.assertEqual(sum(len(batch) for _, batch in batches), 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PurgeTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Purge")
+        self.other = Category.objects.create(name="Keep")
+        self.products = [
+            Product.objects.create(name=f"Purge {index}", category=self.category, price=index + 1) for index in range(5)
+        ]
+        self.items = [Inventory.objects.create(product=product, quantity=1) for product in self.products[:3]]
+        self.kept = Product.objects.create(name="Kept", category=self.other, price=1)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_purge_category_in_batches(self):
+        """ Test a category is purged batch by batch with its inventory and cache entries """
+        cache.set_many({f'product_{self.products[0].id}': {}, f'inventory_{self.items[2].id}': {},
+                        f'product_{self.kept.id}': {}})
+        reports = []
+        stats = purge.purge_category(self.category.id, batch_size=2, pause=0,
+                                     progress=lambda done, total: reports.append((done, total)))
+        self.assertEqual((stats["products"], stats["inventory"]), (5, 3))
+        self.assertEqual(reports, [(2, 5), (4, 5), (5, 5)])
+        self.assertFalse(Category.objects.filter(id=self.category.id).exists())
+        self.assertEqual(list(Product.objects.all()), [self.kept])
+        self.assertFalse(Inventory.objects.exists())
+        self.assertIsNone(cache.get(f'product_{self.products[0].id}'))
+        self.assertIsNone(cache.get(f'inventory_{self.items[2].id}'))
+        self.assertIsNotNone(cache.get(f'product_{self.kept.id}'))
+
+    def test_queries_per_batch_are_bounded(self):
+        """ Test each batch costs the same queries however many rows the category has """
+        # Products with stock, so every batch also cascades to inventory and its daily demand
+        stocked = Product.objects.filter(category=self.category, inventory__isnull=False)
+
+        def purge_cost(batch_size):
+            with count_queries() as queries:
+                purge.purge_products(stocked, batch_size=batch_size, pause=0)
+            return len(queries)
+
+        with transaction.atomic():
+            one_batch = purge_cost(3)
+            transaction.set_rollback(True)
+        three_batches = purge_cost(1)
+        self.assertEqual(three_batches - one_batch, 2 * (one_batch - 2))  # less the count and the final empty page
+
+    def test_command(self):
+        """ Test purging products by id from the command line """
+        out = StringIO()
+        call_command('purge_catalog', '--products', str(self.products[0].id), str(self.kept.id), '--pause', '0',
+                     stdout=out)
+        self.assertIn("Deleted 2 products and 1 inventory rows", out.getvalue())
+        self.assertEqual(Product.objects.count(), 4)
+
+    def test_command_needs_one_target(self):
+        """ Test the command refuses ambiguous or unknown targets """
+        with self.assertRaises(CommandError):
+            call_command('purge_catalog')
+        with self.assertRaises(CommandError):
+            call_command('purge_catalog', '--category', '0')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class IdempotencyKeyTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="scanner", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name="Scanned")
+        self.product = Product.objects.create(name="Scanned", category=self.category, price=1)
+        self.item = Inventory.objects.create(product=self.product, quantity=10)
+        self.increase_url = reverse('inventory-detail', kwargs={'item_id': self.item.id, 'action': 'increase'})
+
+    def tearDown(self):
+        cache.clear()
+
+    def increase(self, amount=5, key="scan-1"):
+        return self.client.put(self.increase_url, {"amount": amount}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_is_replayed(self):
+        """ Test a retried stock increase is applied once and replays the first response """
+        first = self.increase()
+        retry = self.increase()
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 15)
+        self.assertEqual((retry.status_code, retry.data), (first.status_code, first.data))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.increase(key="scan-2")
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 20)
+
+    def test_create_is_replayed(self):
+        """ Test a retried product create returns the first product instead of a duplicate """
+        data = {"name": "Retried", "category_name": "Scanned", "price": "2.00"}
+        first = self.client.post(reverse('product-list'), data, format='json', HTTP_IDEMPOTENCY_KEY="create-1")
+        retry = self.client.post(reverse('product-list'), data, format='json', HTTP_IDEMPOTENCY_KEY="create-1")
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data["data"]["id"], first.data["data"]["id"])
+        self.assertEqual(Product.objects.filter(name="Retried").count(), 1)
+
+    def test_requests_without_key_are_unchanged(self):
+        """ Test requests without the header run every time """
+        self.client.put(self.increase_url, {"amount": 5}, format='json')
+        self.client.put(self.increase_url, {"amount": 5}, format='json')
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 20)
+
+    def test_key_reused_for_other_request(self):
+        """ Test a key reused with a different body is rejected, and keys are scoped per endpoint """
+        self.increase(amount=5)
+        self.assertEqual(self.increase(amount=6).status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        decrease_url = reverse('inventory-detail', kwargs={'item_id': self.item.id, 'action': 'decrease'})
+        response = self.client.put(decrease_url, {"amount": 5}, format='json', HTTP_IDEMPOTENCY_KEY="scan-1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 10)
+
+    def test_concurrent_duplicate_waits_for_result(self):
+        """ Test a duplicate arriving mid-flight waits for the first response instead of running again """
+        key = idempotency.cache_key(SimpleNamespace(method='PUT', path=self.increase_url, user=self.user), "scan-1")
+        marker = (idempotency.IN_FLIGHT, idempotency.fingerprint(SimpleNamespace(data={"amount": 5})))
+        done = (idempotency.DONE, marker[1], 200, {"message": "Successfully increased stock by 5 units."})
+        cache.set(key, marker)
+
+        def first_request_finishes(seconds):
+            cache.set(key, done)
+
+        with mock.patch('inventory_app.idempotency.time.sleep', side_effect=first_request_finishes):
+            response = self.increase()
+        self.assertEqual((response.status_code, response['Idempotent-Replayed']), (status.HTTP_200_OK, 'true'))
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 10)
+
+        cache.set(key, marker)
+        with override_settings(IDEMPOTENCY_WAIT_SECONDS=0):
+            self.assertEqual(self.increase().status_code, status.HTTP_409_CONFLICT)
+
+    def test_claim_lost_to_other_worker(self):
+        """ Test a key claimed by another worker between our lookup and our write is not claimed twice """
+        add = cache.add
+        other = (idempotency.IN_FLIGHT, "other-worker")
+
+        def other_worker_claims_first(key, value, timeout):
+            add(key, other, timeout)
+            return add(key, value, timeout)
+
+        with mock.patch.object(cache, 'add', side_effect=other_worker_claims_first):
+            self.assertEqual(idempotency.claim("idempotency_race", (idempotency.IN_FLIGHT, "ours")), other)
+        self.assertEqual(cache.get("idempotency_race"), other)
+
+    def test_failed_request_frees_key(self):
+        """ Test a request that raised can be retried with the same key """
+        with mock.patch.object(Inventory, 'increase_stock', side_effect=RuntimeError("lost connection")):
+            with self.assertRaises(RuntimeError):
+                self.increase()
+        self.assertEqual(self.increase().status_code, status.HTTP_200_OK)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 15)
+
+    def test_invalid_key(self):
+        """ Test overlong keys are rejected """
+        self.assertEqual(self.increase(key="k" * 256).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SnapshotTest(TestCase):
+    def setUp(self):
+        self.snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.snapshot_dir.cleanup)
+        self.root = self.snapshot_dir.name
+        self.tools = Category.objects.create(name="Tools")
+        self.toys = Category.objects.create(name="Toys")
+        self.products = [
+            Product.objects.create(name=f"Snap {index}", category=self.tools if index % 2 else self.toys,
+                                   price=Decimal(f"{index}.25"))
+            for index in range(6)
+        ]
+        self.items = [Inventory.objects.create(product=product, quantity=index * 10)
+                      for index, product in enumerate(self.products[:4])]
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_open_snapshot_survives_pruning(self):
+        """ Test a reader keeps working after its version is pruned by later refreshes """
+        snapshot.write_snapshot(self.root)
+        snap = snapshot.Snapshot(self.root)
+        for price in (7, 8):
+            Product.objects.filter(id=self.products[0].id).update(price=price, updated_at=timezone.now())
+            snapshot.refresh_snapshot(self.root)
+        self.assertFalse(snap.path.exists())
+        self.assertEqual(snap.price_distribution()[0].sum(), len(self.products))
+        self.assertEqual(snap.rows([0], columns=('name',)), [{'name': self.products[0].name}])
+
+    def assertMatchesDatabase(self, snap):
+        rows = snap.rows(slice(None), columns=('product_id', 'name', 'category_id', 'price_cents', 'inventory_id',
+                                               'quantity'))
+        expected = [
+            {'product_id': product.id, 'name': product.name, 'category_id': product.category_id,
+             'price_cents': int(product.price * 100),
+             'inventory_id': getattr(getattr(product, 'inventory', None), 'id', 0),
+             'quantity': getattr(getattr(product, 'inventory', None), 'quantity', 0)}
+            for product in Product.objects.select_related('inventory').order_by('id')
+        ]
+        self.assertEqual(rows, expected)
+
+    def test_full_snapshot(self):
+        """ Test a snapshot holds every product joined with its inventory, in memory-mapped columns """
+        stats = snapshot.write_snapshot(self.root)
+        snap = snapshot.Snapshot(self.root)
+        self.assertEqual((stats["rows"], len(snap)), (6, 6))
+        self.assertIsInstance(snap['quantity'], np.memmap)
+        self.assertMatchesDatabase(snap)
+
+    def test_aggregates(self):
+        """ Test the vectorized aggregates against the same numbers computed from the database """
+        Inventory.objects.filter(id=self.items[3].id).update(updated_at=timezone.now() - timedelta(days=200))
+        snapshot.write_snapshot(self.root)
+        snap = snapshot.Snapshot(self.root)
+        self.assertEqual(snap.stock_by_category(), {"Tools": 10 + 30, "Toys": 0 + 20})
+        counts, edges = snap.price_distribution(bins=5)
+        self.assertEqual((counts.sum(), edges[0], edges[-1]), (6, 0.25, 5.25))
+        self.assertEqual([row['product_id'] for row in snap.rows(snap.dead_stock(days=90))], [self.products[3].id])
+
+    def test_category_deleted_while_snapshotting(self):
+        """ Test rows whose category vanished before the categories were read are not given to a neighbour """
+        category_rows = snapshot.category_rows
+
+        def replaced_in_between(strings):
+            Category.objects.filter(id=self.toys.id).delete()
+            Category.objects.create(name="Newer")
+            return category_rows(strings)
+
+        with mock.patch.object(snapshot, 'category_rows', side_effect=replaced_in_between):
+            snapshot.write_snapshot(self.root)
+        snap = snapshot.Snapshot(self.root)
+        self.assertEqual(snap.stock_by_category(), {"Tools": 10 + 30, "Newer": 0, None: 0 + 20})
+        self.assertEqual(sorted(set(snap.category_index().tolist())), [-1, 0])
+
+    def test_incremental_refresh(self):
+        """ Test a refresh applies updates, stock changes, inserts and deletes since the last snapshot """
+        snapshot.write_snapshot(self.root)
+        self.products[0].price = Decimal("99.00")
+        self.products[0].save()
+        self.items[1].decrease_stock(5)
+        hot_item = self.items[2]
+        with override_settings(HOT_SKU_IDS={hot_item.id}):
+            hot_item.decrease_stock(1)
+            hot_stock.flush(hot_item.id)
+        Inventory.objects.create(product=self.products[4], quantity=7)
+        Product.objects.create(name="Snap new", category=self.toys, price=1)
+        self.products[5].delete()
+        self.items[3].delete()
+        self.toys.name = "Games"
+        self.toys.save()
+
+        stats = snapshot.refresh_snapshot(self.root)
+        self.assertEqual((stats["changed"], stats["removed"]), (5, 1))
+        snap = snapshot.Snapshot(self.root)
+        self.assertFalse(snap.meta["full"])
+        self.assertMatchesDatabase(snap)
+        self.assertIn("Games", snap.stock_by_category())
+
+    def test_readers_keep_their_version(self):
+        """ Test an open reader keeps reading its version while a refresh publishes a new one """
+        snapshot.write_snapshot(self.root)
+        reader = snapshot.Snapshot(self.root)
+        quantities = np.array(reader['quantity'])
+        self.items[0].increase_stock(100)
+        call_command('snapshot_inventory', '--dir', self.root, stdout=StringIO())
+        np.testing.assert_array_equal(reader['quantity'], quantities)
+        self.assertEqual(snapshot.Snapshot(self.root)['quantity'][0], quantities[0] + 100)
+
+    def test_empty_catalog(self):
+        """ Test an empty catalog snapshots and aggregates without special cases """
+        Product.objects.all().delete()
+        snapshot.write_snapshot(self.root)
+        snap = snapshot.Snapshot(self.root)
+        self.assertEqual((len(snap), snap.rows(snap.dead_stock())), (0, []))
+        self.assertEqual(snap.stock_by_category(), {"Tools": 0, "Toys": 0})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ForecastTest(APITestCase):
+    def setUp(self):
+        self.forecast_dir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(FORECAST_DIR=self.forecast_dir.name)
+        self.settings.enable()
+        category = Category.objects.create(name="Forecast")
+        self.items = [Inventory.objects.create(product=Product.objects.create(name=f"Forecast {index}",
+                                                                              category=category, price=5),
+                                               quantity=quantity)
+                      for index, quantity in enumerate((10, 500, 3))]
+        self.today = timezone.localdate()
+
+    def tearDown(self):
+        self.settings.disable()
+        self.forecast_dir.cleanup()
+        cache.clear()
+
+    def test_decrease_records_daily_demand(self):
+        """ Test stock decreases add up in one DailyDemand row per SKU and day """
+        item = self.items[1]
+        item.decrease_stock(3)
+        item.decrease_stock(4)
+        DailyDemand.record(item.id, 2, day=self.today - timedelta(days=1))
+        self.assertEqual(dict(item.daily_demand.values_list('day', 'quantity')),
+                         {self.today: 7, self.today - timedelta(days=1): 2})
+        with self.assertRaises(ValidationError):
+            item.decrease_stock(1000)
+        self.assertEqual(item.daily_demand.get(day=self.today).quantity, 7)
+
+    def test_hot_decrease_recorded_on_flush(self):
+        """ Test hot SKU demand is counted in the cache and written by the flusher """
+        item = self.items[1]
+        with override_settings(HOT_SKU_IDS={item.id}):
+            item.decrease_stock(5)
+            item.decrease_stock(6)
+            self.assertFalse(item.daily_demand.exists())
+            hot_stock.flush(item.id)
+            hot_stock.flush(item.id)
+        self.assertEqual(item.daily_demand.get(day=self.today).quantity, 11)
+
+    def test_forecast_math(self):
+        """ Test the vectorized forecast against values worked out by hand """
+        # SKU 0 sold 2 then 4 units on the last two of four days; SKU 1 sold nothing
+        sums = forecasting.demand_sums(np.array([0, 0]), np.array([2, 3]), np.array([2.0, 4.0]), 2,
+                                       days=4, window=2, alpha=0.5)
+        columns = forecasting.forecast(*sums, np.array([5, 0]), days=4, window=2, alpha=0.5, lead_time=2, review=1,
+                                       z=1)
+        ewma = (2 * 0.25 + 4 * 0.5) / 0.9375
+        np.testing.assert_allclose(columns['sma'], [3, 0])
+        np.testing.assert_allclose(columns['std'], [1, 0])
+        np.testing.assert_allclose(columns['ewma'], [ewma, 0], rtol=1e-6)
+        np.testing.assert_allclose(columns['safety_stock'], [2 ** 0.5, 0], rtol=1e-6)
+        np.testing.assert_allclose(columns['reorder_point'], [ewma * 2 + 2 ** 0.5, 0], rtol=1e-6)
+        self.assertEqual(columns['suggested_order'].tolist(), [5, 0])  # up to ewma * 3 + safety stock
+        self.assertEqual(columns['days_of_cover'][1], np.inf)
+        self.assertAlmostEqual(float(columns['days_of_cover'][0]), 5 / ewma, places=5)
+
+    def test_database_sums_match_numpy(self):
+        """ Test the GROUP BY in load_demand gives the sums demand_sums computes from raw rows """
+        start = self.today - timedelta(days=30)
+        rng = np.random.default_rng(1)
+        triplets = []
+        for position, item in enumerate(self.items):
+            for day in rng.choice(30, size=12, replace=False).tolist():
+                quantity = int(rng.integers(1, 9))
+                DailyDemand.record(item.id, quantity, day=start + timedelta(days=day))
+                triplets.append((position, day, quantity))
+        sku, day, quantity = (np.array(column) for column in zip(*triplets))
+        expected = forecasting.demand_sums(sku, day, quantity.astype(float), 3, days=30, window=7, alpha=0.3)
+
+        inventory_ids = np.array([item.id for item in self.items])
+        *sums, rows = forecasting.load_demand(inventory_ids, start, 30, window=7, alpha=0.3, chunk_size=2)
+        self.assertEqual(rows, 36)
+        for got, want in zip(sums, expected):
+            np.testing.assert_allclose(got, want)
+
+        # Demand of SKUs missing from the loaded ids is dropped, not counted against a neighbour
+        *sums, rows = forecasting.load_demand(inventory_ids[1:2], start, 30, window=7, alpha=0.3)
+        self.assertEqual(rows, 12)
+        np.testing.assert_allclose(sums[2], expected[2][1:2])
+
+    def test_endpoints(self):
+        """ Test the per-SKU forecast and the reorder report, most urgent first """
+        user = User.objects.create_user(username="forecast", password="pass1234")
+        self.client.force_authenticate(user)
+        detail = reverse('inventory-forecast', kwargs={'item_id': self.items[0].id})
+        report = reverse('inventory-forecast-report')
+        self.assertEqual(self.client.get(detail).status_code, status.HTTP_404_NOT_FOUND)
+
+        for days_ago in range(1, 15):
+            for item in self.items:
+                DailyDemand.record(item.id, 2, day=self.today - timedelta(days=days_ago))
+        DailyDemand.record(self.items[0].id, 50, day=self.today)  # today is not part of the history
+        stats = forecasting.run_forecast(history_days=28)
+        self.assertEqual((stats["skus"], stats["demand_rows"], stats["reorder"]), (3, 42, 2))
+
+        response = self.client.get(detail)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["inventory_id"], self.items[0].id)
+        self.assertEqual(response.data["on_hand"], 10)
+        self.assertEqual(response.data["sma"], 1.0)
+        self.assertGreater(response.data["suggested_order"], 0)
+        self.assertIn("generated_at", response.data)
+        missing = reverse('inventory-forecast', kwargs={'item_id': self.items[-1].id + 100})
+        self.assertEqual(self.client.get(missing).status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(report)
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual([row["inventory_id"] for row in response.data["results"]],
+                         [self.items[2].id, self.items[0].id])
+        self.assertEqual(response.data["results"][0]["product_name"], "Forecast 2")
+        self.assertEqual(len(self.client.get(report + '?limit=1&offset=1').data["results"]), 1)
+        self.assertEqual(self.client.get(report + '?limit=0').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_command_and_job(self):
+        """ Test the command and the forecast_demand job publish a new version """
+        out = StringIO()
+        call_command('forecast_demand', '--days', '7', stdout=out)
+        self.assertIn("3 SKUs", out.getvalue())
+        first = forecasting.Forecast.current().path.name
+        job = jobs.enqueue('forecast_demand', {"history_days": 7})
+        jobs.run_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED, job.error)
+        self.assertEqual(job.result["skus"], 3)
+        self.assertNotEqual(forecasting.Forecast.current().path.name, first)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, TOKEN_BUCKETS={})
+class EndpointBudgetTest(LatencyBaselineMixin, APITestCase):
+    """
+    Exact query budgets for every inventory_app route, cold and warm cache, at
+    several data sizes: a budget that changes with the size is an N+1.
+    """
+    SIZES = (1, 10, 50)
+    # name: (cold cache, warm cache)
+    READ_BUDGETS = {
+        'product-list': (1, 1),
+        'product-list-fields': (1, 1),
+        'product-multi-get': (1, 0),
+        'product-detail': (1, 0),
+        'inventory-multi-get': (1, 0),
+        'inventory-detail': (1, 0),
+        'job-detail': (1, 1),
+        'job-download': (1, 1),
+        'inventory-forecast': (0, 0),
+        'inventory-forecast-report': (1, 1),
+    }
+    WRITE_BUDGETS = {
+        'product-create': 3,
+        'product-update': 2,
+        'inventory-create': 3,
+        'inventory-increase': 2,
+        # The first decrease of the day also inserts its DailyDemand row (in a savepoint, to survive a race)
+        'inventory-decrease': 8,
+        'job-create': 1,
+        'inventory-delete': 3,
+        'product-delete': 3,
+    }
+
+    def setUp(self):
+        self.result_dir = tempfile.TemporaryDirectory()
+        self.results = override_settings(JOBS_RESULT_DIR=self.result_dir.name, FORECAST_DIR=self.result_dir.name)
+        self.results.enable()
+        self.user = User.objects.create_user(username="budgets", password="pass1234")
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        self.results.disable()
+        self.result_dir.cleanup()
+        cache.clear()
+
+    def populate(self, size):
+        """
+        `size` products, each in its own category and with stock and demand that
+        puts it on the reorder report, plus a finished export job and a forecast
+        """
+        Category.objects.all().delete()
+        Job.objects.all().delete()
+        cache.clear()
+        categories = Category.objects.bulk_create(Category(name=f"Budget {index}") for index in range(size))
+        products = Product.objects.bulk_create(
+            Product(name=f"Budget {index}", category=category, price=index + 1)
+            for index, category in enumerate(categories))
+        items = Inventory.objects.bulk_create(Inventory(product=product, quantity=100) for product in products)
+        yesterday = timezone.localdate() - timedelta(days=1)
+        DailyDemand.objects.bulk_create(DailyDemand(inventory=item, day=yesterday, quantity=50) for item in items)
+        forecasting.run_forecast(self.result_dir.name)
+        with open(f"{self.result_dir.name}/export.json", 'w') as f:
+            f.write("[]")
+        job = Job.objects.create(name="export_products", status=Job.SUCCEEDED, result={"file": "export.json"})
+        return products, items, job
+
+    def reads(self, products, items, job):
+        product_ids = ','.join(str(product.id) for product in products)
+        item_ids = ','.join(str(item.id) for item in items)
+        return {
+            'product-list': reverse('product-list'),
+            'product-list-fields': reverse('product-list') + '?fields=id,name,category_name',
+            'product-multi-get': reverse('product-list') + f'?ids={product_ids}',
+            'product-detail': reverse('product-detail', kwargs={'product_id': products[-1].id}),
+            'inventory-multi-get': reverse('inventory') + f'?ids={item_ids}',
+            'inventory-detail': reverse('inventory-detail', kwargs={'item_id': items[-1].id}),
+            'job-detail': reverse('job-detail', kwargs={'job_id': job.id}),
+            'job-download': reverse('job-download', kwargs={'job_id': job.id}),
+            'inventory-forecast': reverse('inventory-forecast', kwargs={'item_id': items[-1].id}),
+            'inventory-forecast-report': reverse('inventory-forecast-report'),
+        }
+
+    def writes(self, products, items):
+        """ Requests in an order that leaves each one valid: (name, method, url, data) """
+        item, product = items[-1], products[-1]
+        new_product = {"name": "Budget new", "category_name": product.category.name, "price": "9.99"}
+        return [
+            ('product-create', 'post', reverse('product-list'), new_product),
+            ('product-update', 'put', reverse('product-detail', kwargs={'product_id': product.id}),
+             {"price": "19.99"}),
+            ('inventory-create', 'post', reverse('inventory'),
+             lambda: {"product": Product.objects.get(name="Budget new").id, "quantity": 5}),
+            ('inventory-increase', 'put',
+             reverse('inventory-detail', kwargs={'item_id': item.id, 'action': 'increase'}), {"amount": 5}),
+            ('inventory-decrease', 'put',
+             reverse('inventory-detail', kwargs={'item_id': item.id, 'action': 'decrease'}), {"amount": 5}),
+            ('job-create', 'post', reverse('job-list'), {"name": "rebuild_cache"}),
+            ('inventory-delete', 'delete', reverse('inventory-detail', kwargs={'item_id': item.id}), None),
+            ('product-delete', 'delete', reverse('product-detail', kwargs={'product_id': product.id}), None),
+        ]
+
+    def request(self, method, url, data=None):
+        response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 300, (url, getattr(response, 'data', None)))
+        if hasattr(response, 'streaming_content'):
+            b''.join(response.streaming_content)
+        response.close()
+        return response
+
+    def test_read_budgets(self):
+        """ Test each read costs the same number of queries, cold and warm, whatever the data size """
+        for size in self.SIZES:
+            products, items, job = self.populate(size)
+            for name, url in self.reads(products, items, job).items():
+                with self.subTest(size=size, endpoint=name):
+                    cache.clear()
+                    costs = []
+                    for _ in ('cold', 'warm'):
+                        with count_queries() as queries:
+                            self.request('get', url)
+                        costs.append(len(queries))
+                    self.assertEqual(tuple(costs), self.READ_BUDGETS[name], queries)
+
+    def test_write_budgets(self):
+        """ Test each write costs the same number of queries whatever the data size """
+        for size in self.SIZES:
+            products, items, _ = self.populate(size)
+            for name, method, url, data in self.writes(products, items):
+                with self.subTest(size=size, endpoint=name):
+                    data = data() if callable(data) else data
+                    with count_queries() as queries:
+                        self.request(method, url, data)
+                    self.assertEqual(len(queries), self.WRITE_BUDGETS[name], queries)
+
+    def test_routes_covered(self):
+        """ Test every named route in inventory_app/urls.py has a budget """
+        from .urls import urlpatterns
+        route_names = {pattern.name for pattern in urlpatterns}
+        budget_routes = {'inventory', 'inventory-detail', 'product-list', 'product-detail',
+                         'job-list', 'job-detail', 'job-download', 'inventory-forecast', 'inventory-forecast-report'}
+        self.assertEqual(route_names, budget_routes)
+
+    def test_latency_baselines(self):
+        """ Test no endpoint got slower than its recorded baseline, warm cache and 50 rows """
+        products, items, job = self.populate(self.SIZES[-1])
+        for name, url in self.reads(products, items, job).items():
+            with self.subTest(endpoint=name):
+                self.request('get', url)
+                self.assertWithinBaseline(f"inventory_app.{name}", lambda: self.request('get', url))
+
+        increase = reverse('inventory-detail', kwargs={'item_id': items[0].id, 'action': 'increase'})
+        self.assertWithinBaseline("inventory_app.inventory-increase",
+                                  lambda: self.request('put', increase, {"amount": 1}))
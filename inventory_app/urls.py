@@ -1,15 +1,21 @@
 
 from django.urls import path
-from .views import InventoryAPIView,ProductAPIView
+from .views import InventoryAPIView,ProductAPIView,JobAPIView,JobDownloadAPIView,ForecastAPIView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 urlpatterns = [
 
     path('items/', InventoryAPIView.as_view(), name='inventory'),
+    path('items/forecast/', ForecastAPIView.as_view(), name='inventory-forecast-report'),
     path('items/<int:item_id>/', InventoryAPIView.as_view(), name='inventory-detail'),
+    path('items/<int:item_id>/forecast', ForecastAPIView.as_view(), name='inventory-forecast'),
     path('items/<int:item_id>/<str:action>', InventoryAPIView.as_view(), name='inventory-detail'),
 
     path('products/', ProductAPIView.as_view(), name='product-list'),
     path('products/<int:product_id>', ProductAPIView.as_view(), name='product-detail'),
 
+    path('jobs/', JobAPIView.as_view(), name='job-list'),
+    path('jobs/<uuid:job_id>', JobAPIView.as_view(), name='job-detail'),
+    path('jobs/<uuid:job_id>/download', JobDownloadAPIView.as_view(), name='job-download'),
+
 ]
\ No newline at end of file
@@ -0,0 +1,18 @@
+def chunked_rows(queryset, fields, chunk_size=1000):
+    """
+    `values_list(*fields)` rows of `queryset` in ascending id chunks, paginated by
+    key rather than offset. `fields` must start with 'id'.
+    """
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id).order_by('id').values_list(*fields)[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def chunked_ids(queryset, chunk_size=1000):
+    """ Primary keys of `queryset` in ascending chunks, paginated by key rather than offset """
+    for rows in chunked_rows(queryset, ('id',), chunk_size):
+        yield [row[0] for row in rows]
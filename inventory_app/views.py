@@ -4,16 +4,24 @@ from rest_framework.response import Response
 #models
 
 from .models import Product as ProductModel
-from .models import Inventory
+from .models import Inventory, Job
+from .cache_warming import CACHE_TIMEOUT
+from . import hot_stock
+from .routers import cache_timeout
+from .idempotency import idempotent
+from .forecasting import Forecast
 
 #serializers
-from .serializers import CategorySerializer,ProductSerializer,InventorySerializer
+from .serializers import CategorySerializer,ProductSerializer,InventorySerializer,DynamicFieldsModelSerializer,RowSerializer,JobSerializer
 
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 
 
 from django.shortcuts import get_object_or_404
+from django.http import FileResponse
+from django.conf import settings
+from pathlib import Path
 from rest_framework import status
 from django.core.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
@@ -22,29 +30,94 @@ from rest_framework.permissions import IsAuthenticated
 from django.core.cache import cache
 
 
+MAX_MULTI_GET = 100
+MAX_REPORT_PAGE = 1000
+
+
+def parse_ids(raw_ids):
+    """ Parse `?ids=1,2,3` into unique ids in request order, or None if malformed """
+    try:
+        ids = [int(item_id) for item_id in raw_ids.split(',') if item_id.strip()]
+    except ValueError:
+        return None
+    if not ids or len(ids) > MAX_MULTI_GET:
+        return None
+    return list(dict.fromkeys(ids))
+
+
+def get_many_cached(ids, key_prefix, queryset, serializer_class):
+    """
+    Serialized objects for `ids` in request order plus the ids that do not exist.
+    One cache.get_many, one IN query (joins included) for the misses and one set_many to backfill.
+    """
+    keys = {f'{key_prefix}_{item_id}': item_id for item_id in ids}
+    found = {keys[key]: data for key, data in cache.get_many(list(keys)).items()}
+
+    misses = [item_id for item_id in ids if item_id not in found]
+    if misses:
+        rows = RowSerializer(serializer_class).serialize(queryset.filter(id__in=misses))
+        loaded = {data['id']: data for data in rows}
+        if loaded:
+            cache.set_many({f'{key_prefix}_{item_id}': data for item_id, data in loaded.items()},
+                           timeout=cache_timeout(CACHE_TIMEOUT))
+        found.update(loaded)
+
+    results = [found[item_id] for item_id in ids if item_id in found]
+    missing = [item_id for item_id in ids if item_id not in found]
+    return results, missing
+
+
+def requested_fields(request, serializer_class):
+    """ `?fields=` parsed for `serializer_class`, None when absent; raises ValueError when invalid """
+    if 'fields' not in request.query_params:
+        return None
+    return serializer_class.parse_fields(request.query_params['fields'])
+
+
+def project(data, fields):
+    return data if fields is None else DynamicFieldsModelSerializer.project_data(data, fields)
+
+
 # Create your views here.
 class ProductAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    replica_reads = True
+    throttle_scope = 'products'
     def get(self, request,product_id = None):
+        try:
+            fields = requested_fields(request, ProductSerializer)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Cached entries always hold every field; projections are cut from them
         if product_id:
             cache_key = f'product_{product_id}'
             cached_product = cache.get(cache_key)
             print(cached_product)
             if cached_product:
                 print("redis")
-                return Response(cached_product, status=status.HTTP_200_OK)
+                return Response(project(cached_product, fields), status=status.HTTP_200_OK)
 
-            product = get_object_or_404(ProductModel, id=product_id)
+            product = get_object_or_404(ProductModel.objects.select_related('category'), id=product_id)
             serializer = ProductSerializer(product)
 
-            cache.set(cache_key, serializer.data, timeout=60*15)
+            cache.set(cache_key, serializer.data, timeout=cache_timeout(CACHE_TIMEOUT))
+
+            return Response(project(serializer.data, fields), status=status.HTTP_200_OK)
 
-            return Response(serializer.data, status=status.HTTP_200_OK)
+        if 'ids' in request.query_params:
+            ids = parse_ids(request.query_params['ids'])
+            if ids is None:
+                return Response({"error": f"ids must be 1 to {MAX_MULTI_GET} comma separated integers."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            results, missing = get_many_cached(ids, 'product', ProductModel.objects.all(), ProductSerializer)
+            results = [project(data, fields) for data in results]
+            return Response({"results": results, "missing": missing}, status=status.HTTP_200_OK)
     
         products = ProductModel.objects.all()
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(RowSerializer(ProductSerializer, fields).serialize(products), status=status.HTTP_200_OK)
     
+    @idempotent
     def post(self,request,):
         data = request.data
         serializer = ProductSerializer(data = data)
@@ -62,7 +135,7 @@ class ProductAPIView(APIView):
             return Response({"error": " Product Id is required for updating."}, status=status.HTTP_400_BAD_REQUEST)
 
         data = request.data
-        oProduct = ProductModel.objects.get(id = product_id)
+        oProduct = ProductModel.objects.select_related('category').get(id = product_id)
         serializer = ProductSerializer(oProduct,data = data, partial = True)
         if not serializer.is_valid():
             return Response({"message":serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
@@ -71,7 +144,7 @@ class ProductAPIView(APIView):
         cache_key = f'product_{product.id}'
         cache.delete(cache_key)
 
-        cache.set(cache_key, serializer.data, timeout=60*15) # Cache for 15 minutes
+        cache.set(cache_key, serializer.data, timeout=CACHE_TIMEOUT)
 
         return Response({"message": f"Product Id {product_id} updated"}, status=201)
 
@@ -80,15 +153,35 @@ class ProductAPIView(APIView):
             return Response({"error": " Product Id is required for deleting."}, status=status.HTTP_400_BAD_REQUEST)
 
         product = get_object_or_404(ProductModel, id=product_id)
+        inventory_ids = []
+        if settings.HOT_SKU_IDS:
+            inventory_ids = list(Inventory.objects.filter(product_id=product_id).values_list('id', flat=True))
         product.delete()
         cache_key = f'product_{product_id}'
         cache.delete(cache_key)
+        hot_stock.forget(inventory_ids)
 
         return Response({"message": "Product deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
 
 class InventoryAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    replica_reads = True
+    throttle_scope = 'inventory'
     def get(self, request, item_id = None):
+        try:
+            fields = requested_fields(request, InventorySerializer)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not item_id and 'ids' in request.query_params:
+            ids = parse_ids(request.query_params['ids'])
+            if ids is None:
+                return Response({"error": f"ids must be 1 to {MAX_MULTI_GET} comma separated integers."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            results, missing = get_many_cached(ids, 'inventory', Inventory.objects.all(), InventorySerializer)
+            results = [project(self.with_hot_stock(data['id'], data), fields) for data in results]
+            return Response({"results": results, "missing": missing}, status=status.HTTP_200_OK)
+
         if not item_id:
             return Response({"error": "Item ID is required for getting."}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -98,16 +191,24 @@ class InventoryAPIView(APIView):
         print("cached_inv",cached_inventory)
 
         if cached_inventory:
-            return Response(cached_inventory, status=status.HTTP_200_OK)
+            return Response(project(self.with_hot_stock(item_id, cached_inventory), fields), status=status.HTTP_200_OK)
 
         try:
-            oInventory = Inventory.objects.get(id = item_id)
+            oInventory = Inventory.objects.select_related('product').get(id = item_id)
             serializer = InventorySerializer(oInventory)
-            cache.set(cache_key, serializer.data, timeout=60*15) # Cache for 15 minutes
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            cache.set(cache_key, serializer.data, timeout=cache_timeout(CACHE_TIMEOUT))
+            return Response(project(self.with_hot_stock(item_id, serializer.data), fields), status=status.HTTP_200_OK)
         except Inventory.DoesNotExist:
             return Response({"error": "Inventory item not found."}, status=status.HTTP_404_NOT_FOUND)
     
+    @staticmethod
+    def with_hot_stock(item_id, data):
+        # Hot SKUs keep their live count in the cache; the row lags until the next flush
+        if not hot_stock.is_hot(item_id):
+            return data
+        return {**data, "quantity": hot_stock.available(item_id)}
+
+    @idempotent
     def post(self,request,):
         data = request.data
         serializer = InventorySerializer(data = data)
@@ -119,6 +220,7 @@ class InventoryAPIView(APIView):
         cache.delete(cache_key)
         return Response({"message": "Successfully Inventory created","data":serializer.data}, status=status.HTTP_200_OK)
 
+    @idempotent
     def put(self,request, item_id = None,action = None):
 
         if not item_id or action not in ['increase', 'decrease']:
@@ -157,7 +259,76 @@ class InventoryAPIView(APIView):
 
             cache_key = f'inventory_{item_id}'
             cache.delete(cache_key)
+            hot_stock.forget([item_id])
 
             return Response({"message": f"Inventory {item_id} successfully deleted"}, status=status.HTTP_204_NO_CONTENT)
         except Inventory.DoesNotExist:
-            return Response({"error": "Inventory item not found."}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            return Response({"error": "Inventory item not found."}, status=status.HTTP_404_NOT_FOUND)
+
+class JobAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id=None):
+        if not job_id:
+            return Response({"error": "Job ID is required for getting."}, status=status.HTTP_400_BAD_REQUEST)
+        job = get_object_or_404(Job, id=job_id)
+        return Response(JobSerializer(job).data, status=status.HTTP_200_OK)
+
+    def post(self, request):
+        serializer = JobSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"message": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = serializer.save()
+        return Response({"message": "Job queued", "data": JobSerializer(job).data}, status=status.HTTP_202_ACCEPTED)
+
+
+class JobDownloadAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = get_object_or_404(Job, id=job_id)
+        if job.status != Job.SUCCEEDED or not (job.result or {}).get("file"):
+            return Response({"error": "Job has no file to download."}, status=status.HTTP_404_NOT_FOUND)
+        path = Path(settings.JOBS_RESULT_DIR) / job.result["file"]
+        if not path.exists():
+            return Response({"error": "Job file has expired."}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name)
+
+
+class ForecastAPIView(APIView):
+    """ Demand forecast of one SKU (`items/<id>/forecast`), or the reorder report (`items/forecast/`) """
+    permission_classes = [IsAuthenticated]
+    replica_reads = True
+    throttle_scope = 'inventory'
+
+    def get(self, request, item_id=None):
+        forecast = Forecast.current()
+        if forecast is None:
+            return Response({"error": "No forecast has been generated yet."}, status=status.HTTP_404_NOT_FOUND)
+
+        if item_id:
+            position = forecast.index_of(item_id)
+            if position is None:
+                return Response({"error": "No forecast for this inventory item."}, status=status.HTTP_404_NOT_FOUND)
+            data = forecast.entries([position])[0]
+            return Response({**data, "generated_at": forecast.meta['generated_at']}, status=status.HTTP_200_OK)
+
+        try:
+            limit = int(request.query_params.get('limit', 100))
+            offset = int(request.query_params.get('offset', 0))
+        except ValueError:
+            limit = offset = -1
+        if not 0 < limit <= MAX_REPORT_PAGE or offset < 0:
+            return Response({"error": f"limit must be 1 to {MAX_REPORT_PAGE} and offset at least 0."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # SKUs to reorder, the ones running out soonest first
+        positions = forecast.reorder_positions()
+        results = forecast.entries(positions[offset:offset + limit])
+        names = dict(Inventory.objects.filter(id__in=[data['inventory_id'] for data in results])
+                     .values_list('id', 'product__name'))
+        for data in results:
+            data['product_name'] = names.get(data['inventory_id'])
+        return Response({"generated_at": forecast.meta['generated_at'], "count": len(positions), "results": results},
+                        status=status.HTTP_200_OK)
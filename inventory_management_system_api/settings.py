@@ -57,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'inventory_app.routers.ReplicaPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'inventory_management_system_api.urls'
@@ -94,6 +95,23 @@ DATABASES = {
     'default': dj_database_url.config(default = os.getenv('DATABASE_URL') )
 }
 
+# Read replicas, comma separated, e.g. DATABASE_REPLICA_URLS=sqlite:///replica.sqlite3
+DATABASE_REPLICAS = []
+REPLICA_CONNECT_TIMEOUT = int(os.getenv('REPLICA_CONNECT_TIMEOUT', 2))    # seconds; bounds a read on an unreachable replica
+for index, replica_url in enumerate(filter(None, os.getenv('DATABASE_REPLICA_URLS', '').split(','))):
+    alias = f'replica_{index}'
+    DATABASES[alias] = dj_database_url.parse(replica_url.strip())
+    if 'postgresql' in DATABASES[alias]['ENGINE'] or 'mysql' in DATABASES[alias]['ENGINE']:
+        DATABASES[alias].setdefault('OPTIONS', {})['connect_timeout'] = REPLICA_CONNECT_TIMEOUT
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['inventory_app.routers.PrimaryReplicaRouter']
+
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))            # read-your-writes window
+REPLICA_EJECT_SECONDS = int(os.getenv('REPLICA_EJECT_SECONDS', 30))        # how long a failed replica is skipped
+REPLICA_HEALTH_CHECK_SECONDS = int(os.getenv('REPLICA_HEALTH_CHECK_SECONDS', 10))
+
 CACHES = {
     'default': {
         'BACKEND': 'django_redis.cache.RedisCache',
@@ -104,6 +122,29 @@ CACHES = {
     }
 }
 
+# Inventory ids whose stock is counted in Redis and flushed in batches (see inventory_app/hot_stock.py)
+HOT_SKU_IDS = {int(item_id) for item_id in os.getenv('HOT_SKU_IDS', '').split(',') if item_id.strip()}
+
+# Background jobs (inventory_app/jobs.py); memory:// works for a single process,
+# sqla+sqlite:///jobs-broker.sqlite3 for a local multi-process setup (needs SQLAlchemy)
+JOBS_BROKER_URL = os.getenv('JOBS_BROKER_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+JOBS_QUEUE = 'inventory-jobs'
+JOBS_CONCURRENCY = int(os.getenv('JOBS_CONCURRENCY', 2))
+JOBS_MAX_ATTEMPTS = 3
+JOBS_STALE_SECONDS = 600  # a running job without progress for this long is queued again
+JOBS_RESULT_DIR = os.getenv('JOBS_RESULT_DIR', BASE_DIR / 'job_results')
+
+# Columnar analytics snapshots (inventory_app/snapshot.py), written by `manage.py snapshot_inventory`
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', BASE_DIR / 'snapshots')
+
+# Demand forecasting (inventory_app/forecasting.py), run by `manage.py forecast_demand` or the job
+FORECAST_DIR = os.getenv('FORECAST_DIR', BASE_DIR / 'forecasts')
+FORECAST_HISTORY_DAYS = 365
+FORECAST_WINDOW_DAYS = 28       # moving average and demand variability window
+FORECAST_ALPHA = 0.3            # exponential smoothing factor
+FORECAST_LEAD_TIME_DAYS = 7     # supplier lead time
+FORECAST_REVIEW_DAYS = 7        # days between orders
+FORECAST_SERVICE_Z = 1.65       # safety stock z-score, ~95% service level
 
 
 # Password validation
@@ -135,8 +176,29 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'inventory_app.throttling.TokenBucketThrottle',
+    ),
+    # Reverse proxies in front of the app; anonymous clients are keyed on the X-Forwarded-For entry the last of
+    # them appended. With 0 the header is ignored and REMOTE_ADDR is used, so clients cannot pick their own bucket
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 0)),
+}
+
+# Token buckets per view scope: `rate` tokens are refilled per second up to `capacity` (the burst size)
+TOKEN_BUCKETS = {
+    'products': {'rate': 20, 'capacity': 100},
+    'inventory': {'rate': 20, 'capacity': 100},
+    'login': {'rate': 0.2, 'capacity': 5},
 }
 
+# Per-username overrides, e.g. {'warehouse-sync': {'products': {'rate': 100, 'capacity': 500}}}
+TOKEN_BUCKET_USER_LIMITS = {}
+
+# Idempotency-Key handling (inventory_app/idempotency.py)
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 60*60*24))        # how long responses are replayed
+IDEMPOTENCY_LOCK_SECONDS = 30   # a request that died in flight frees its key after this
+IDEMPOTENCY_WAIT_SECONDS = 10   # how long a concurrent duplicate waits before getting 409
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30), 
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),  
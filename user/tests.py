@@ -1,3 +1,119 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.core.cache import cache
 
-# Create your tests here.
+from inventory_app.testing import LatencyBaselineMixin, count_queries
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+# Hashing dominates these endpoints otherwise; the budgets are about queries
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PASSWORD_HASHERS=FAST_HASHERS)
+class UserAPITest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="pass1234")
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_registration(self):
+        """ Test registering returns a token pair for the new user """
+        data = {"username": "bob", "email": "bob@example.com", "password": "pass1234"}
+        response = self.client.post(reverse('registration'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn("access", response.data)
+        self.assertTrue(User.objects.get(username="bob").check_password("pass1234"))
+
+    def test_registration_duplicate_username(self):
+        """ Test an existing username is rejected """
+        data = {"username": "alice", "email": "other@example.com", "password": "pass1234"}
+        response = self.client.post(reverse('registration'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"errors": {"username": ["A user with that username already exists."]}})
+
+    def test_login(self):
+        """ Test valid credentials return a token pair that authenticates API requests """
+        response = self.client.post(reverse('login'), {"username": "alice", "password": "pass1234"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        self.assertEqual(self.client.get(reverse('product-list')).status_code, status.HTTP_200_OK)
+
+    def test_login_invalid(self):
+        """ Test wrong credentials are rejected """
+        response = self.client.post(reverse('login'), {"username": "alice", "password": "wrong"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_token_refresh(self):
+        """ Test the simplejwt token pair and refresh endpoints """
+        pair = self.client.post(reverse('token_obtain_pair'), {"username": "alice", "password": "pass1234"},
+                                format='json')
+        self.assertEqual(pair.status_code, status.HTTP_200_OK)
+        refreshed = self.client.post(reverse('token_refresh'), {"refresh": pair.data["refresh"]}, format='json')
+        self.assertEqual(refreshed.status_code, status.HTTP_200_OK)
+        self.assertIn("access", refreshed.data)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PASSWORD_HASHERS=FAST_HASHERS, TOKEN_BUCKETS={})
+class UserEndpointBudgetTest(LatencyBaselineMixin, APITestCase):
+    """ Exact query budgets for every user route, whatever the number of users """
+    SIZES = (1, 10, 50)
+    BUDGETS = {
+        'registration': 2,
+        'login': 1,
+        'token_obtain_pair': 1,
+        'token_refresh': 0,
+        'jwt-authenticated-request': 2,
+    }
+
+    def tearDown(self):
+        cache.clear()
+
+    def populate(self, size):
+        User.objects.all().delete()
+        User.objects.bulk_create(User(username=f"user{index}") for index in range(size - 1))
+        return User.objects.create_user(username="alice", email="alice@example.com", password="pass1234")
+
+    def calls(self, size):
+        """ (name, request) pairs; each request returns a response """
+        credentials = {"username": "alice", "password": "pass1234"}
+        new_user = {"username": f"new{size}", "email": "new@example.com", "password": "pass1234"}
+        refresh = self.client.post(reverse('token_obtain_pair'), credentials, format='json').data["refresh"]
+        access = self.client.post(reverse('login'), credentials, format='json').data["access"]
+        return [
+            ('registration', lambda: self.client.post(reverse('registration'), new_user, format='json')),
+            ('login', lambda: self.client.post(reverse('login'), credentials, format='json')),
+            ('token_obtain_pair', lambda: self.client.post(reverse('token_obtain_pair'), credentials, format='json')),
+            ('token_refresh', lambda: self.client.post(reverse('token_refresh'), {"refresh": refresh}, format='json')),
+            ('jwt-authenticated-request',
+             lambda: self.client.get(reverse('product-list'), HTTP_AUTHORIZATION=f'Bearer {access}')),
+        ]
+
+    def test_query_budgets(self):
+        """ Test each user endpoint costs the same number of queries whatever the number of users """
+        for size in self.SIZES:
+            self.populate(size)
+            for name, call in self.calls(size):
+                with self.subTest(size=size, endpoint=name):
+                    with count_queries() as queries:
+                        response = call()
+                    self.assertLess(response.status_code, 300, response.data)
+                    self.assertEqual(len(queries), self.BUDGETS[name], queries)
+
+    def test_routes_covered(self):
+        """ Test every named route in user/urls.py has a budget """
+        from .urls import urlpatterns
+        self.assertEqual({pattern.name for pattern in urlpatterns} - set(self.BUDGETS), set())
+
+    def test_latency_baselines(self):
+        """ Test no user endpoint got slower than its recorded baseline """
+        self.populate(self.SIZES[-1])
+        for name, call in self.calls(0):
+            if name == 'registration':
+                continue  # creates a user per call
+            with self.subTest(endpoint=name):
+                self.assertWithinBaseline(f"user.{name}", call)
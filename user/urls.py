@@ -1,11 +1,11 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from .views import registration,login
+from rest_framework_simplejwt.views import TokenRefreshView
+from .views import registration,login,ThrottledTokenObtainPairView
 
 
 urlpatterns = [
     path('registration/',registration ,name='registration'),
     path('login/',login ,name='login'),
-    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('token/', ThrottledTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 ]
\ No newline at end of file
@@ -1,12 +1,13 @@
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, throttle_classes
 from rest_framework.response import Response
 
-from django.contrib.auth.models import User
 
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import authenticate
 
 from .serializers import UserSerializer
+from inventory_app.throttling import LoginThrottle
 from rest_framework import status
 
 
@@ -21,9 +22,6 @@ def registration(request):
         if not serializer.is_valid():
             return Response({ "errors": serializer.errors},status = status.HTTP_400_BAD_REQUEST)
 
-        if User.objects.filter(username = data.get('username')).exists():
-            return Response({"message": "Username already exists."},status = status.HTTP_400_BAD_REQUEST)
-
         user = serializer.save()
         refresh = RefreshToken.for_user(user)
         return Response({
@@ -35,6 +33,7 @@ def registration(request):
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['POST'])
+@throttle_classes([LoginThrottle])
 def login(request):
     try:
         data = request.data
@@ -54,3 +53,8 @@ def login(request):
             return Response({"status": 400, "message": "Invalid username or password"}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ThrottledTokenObtainPairView(TokenObtainPairView):
+    """ Checks passwords like `login`, so it draws from the same per-IP login bucket """
+    throttle_classes = [LoginThrottle]